@@ -72,11 +72,15 @@ class CustomDatasetDataLoader():
         dataset_class = find_dataset_using_name(opt.dataset_mode)
         self.dataset = dataset_class(opt)
         print("dataset [%s] was created" % type(self.dataset).__name__)
+        loader_options = {}
+        if int(opt.num_threads) > 0:  # prefetching only applies to worker processes
+            loader_options['prefetch_factor'] = opt.prefetch_factor
         self.dataloader = torch.utils.data.DataLoader(
             self.dataset,
             batch_size=opt.batch_size,
             shuffle=not opt.serial_batches,
-            num_workers=int(opt.num_threads))
+            num_workers=int(opt.num_threads),
+            **loader_options)
 
     def load_data(self):
         return self
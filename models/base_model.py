@@ -3,6 +3,7 @@ import torch
 from collections import OrderedDict
 from abc import ABC, abstractmethod
 from . import networks
+from util.stage_timer import StageTimer
 
 
 class BaseModel(ABC):
@@ -42,6 +43,11 @@ class BaseModel(ABC):
         self.optimizers = []
         self.image_paths = []
         self.metric = None # used for learning rate policy 'plateau'
+        self.loss_sums = None  # on-device running sums of the tensor losses, see <accumulate_losses>
+        self.loss_tensor_names = []  # the losses summed in <loss_sums>
+        self.host_loss_sums = OrderedDict()  # running sums of the losses that are plain numbers, e.g. 0 for disabled losses
+        self.loss_count = 0
+        self.timer = StageTimer()  # disabled; the training script replaces it to time the stages of <optimize_parameters>
 
     @staticmethod
     def modify_commandline_options(parser, is_train):
@@ -128,13 +134,47 @@ class BaseModel(ABC):
                 visual_ret[name] = getattr(self, name)
         return visual_ret
 
+    def accumulate_losses(self):
+        """Add the current losses to running sums; called after every <optimize_parameters> in train.py
+
+        Tensor losses are summed on the device and plain numbers (e.g. 0 for a disabled identity loss) on the host,
+        so nothing is copied between host and device and the iteration does not wait for the device.
+        """
+        names = [name for name in self.loss_names if isinstance(name, str)]
+        if not names:
+            return
+        if self.loss_count == 0:  # a new window: which losses are tensors is decided at its first iteration
+            self.loss_tensor_names = [name for name in names if torch.is_tensor(getattr(self, 'loss_' + name))]
+            self.host_loss_sums = OrderedDict((name, 0.0) for name in names if name not in self.loss_tensor_names)
+            self.loss_sums = None
+        if self.loss_tensor_names:
+            losses = torch.stack([torch.as_tensor(getattr(self, 'loss_' + name), dtype=torch.float32, device=self.device).detach()
+                                  for name in self.loss_tensor_names])
+            if self.loss_sums is None:
+                self.loss_sums = losses
+            else:
+                self.loss_sums += losses
+        for name in self.host_loss_sums:
+            self.host_loss_sums[name] += float(getattr(self, 'loss_' + name))
+        self.loss_count += 1
+
     def get_current_losses(self):
-        """Return traning losses / errors. train.py will print out these errors on console, and save them to a file"""
-        errors_ret = OrderedDict()
-        for name in self.loss_names:
-            if isinstance(name, str):
-                errors_ret[name] = float(getattr(self, 'loss_' + name))  # float(...) works for both scalar tensor and float number
-        return errors_ret
+        """Return traning losses / errors. train.py will print out these errors on console, and save them to a file
+
+        If losses were accumulated with <accumulate_losses>, this returns their means over the iterations since the last call
+        and starts a new window; otherwise, it returns the losses of the current iteration. The means of the tensor losses
+        are read with a single blocking device-to-host copy, i.e. one wait for the device per print window.
+        """
+        names = [name for name in self.loss_names if isinstance(name, str)]
+        if self.loss_count > 0:
+            means = {name: total / self.loss_count for name, total in self.host_loss_sums.items()}
+            if self.loss_sums is not None:
+                means.update(zip(self.loss_tensor_names, (self.loss_sums / self.loss_count).tolist()))
+            values = [means[name] for name in names]
+            self.loss_count = 0
+        else:
+            values = [float(getattr(self, 'loss_' + name)) for name in names]  # float(...) works for both scalar tensor and float number
+        return OrderedDict(zip(names, values))
 
     def save_networks(self, epoch):
         """Save all the networks to the disk.
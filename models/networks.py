@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 from torch.nn import init
+from torch.utils.checkpoint import checkpoint, checkpoint_sequential
 import functools
 from torch.optim import lr_scheduler
 
@@ -109,7 +110,7 @@ def init_net(net, init_type='normal', init_gain=0.02, gpu_ids=[]):
     return net
 
 
-def define_G(input_nc, output_nc, ngf, netG, norm='batch', use_dropout=False, init_type='normal', init_gain=0.02, gpu_ids=[]):
+def define_G(input_nc, output_nc, ngf, netG, norm='batch', use_dropout=False, init_type='normal', init_gain=0.02, gpu_ids=[], checkpoint_segments=0):
     """Create a generator
 
     Parameters:
@@ -122,6 +123,8 @@ def define_G(input_nc, output_nc, ngf, netG, norm='batch', use_dropout=False, in
         init_type (str)    -- the name of our initialization method.
         init_gain (float)  -- scaling factor for normal, xavier and orthogonal.
         gpu_ids (int list) -- which GPUs the network runs on: e.g., 0,1,2
+        checkpoint_segments (int) -- activation checkpointing; 0 disables it. For resnet generators, the Resnet blocks
+                                     are split into this many segments; for unet generators, any value > 0 checkpoints every skip block.
 
     Returns a generator
 
@@ -140,13 +143,13 @@ def define_G(input_nc, output_nc, ngf, netG, norm='batch', use_dropout=False, in
     norm_layer = get_norm_layer(norm_type=norm)
 
     if netG == 'resnet_9blocks':
-        net = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, use_dropout=use_dropout, n_blocks=9)
+        net = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, use_dropout=use_dropout, n_blocks=9, checkpoint_segments=checkpoint_segments)
     elif netG == 'resnet_6blocks':
-        net = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, use_dropout=use_dropout, n_blocks=6)
+        net = ResnetGenerator(input_nc, output_nc, ngf, norm_layer=norm_layer, use_dropout=use_dropout, n_blocks=6, checkpoint_segments=checkpoint_segments)
     elif netG == 'unet_128':
-        net = UnetGenerator(input_nc, output_nc, 7, ngf, norm_layer=norm_layer, use_dropout=use_dropout)
+        net = UnetGenerator(input_nc, output_nc, 7, ngf, norm_layer=norm_layer, use_dropout=use_dropout, use_checkpoint=checkpoint_segments > 0)
     elif netG == 'unet_256':
-        net = UnetGenerator(input_nc, output_nc, 8, ngf, norm_layer=norm_layer, use_dropout=use_dropout)
+        net = UnetGenerator(input_nc, output_nc, 8, ngf, norm_layer=norm_layer, use_dropout=use_dropout, use_checkpoint=checkpoint_segments > 0)
     else:
         raise NotImplementedError('Generator model name [%s] is not recognized' % netG)
     return init_net(net, init_type, init_gain, gpu_ids)
@@ -312,7 +315,7 @@ class ResnetGenerator(nn.Module):
     We adapt Torch code and idea from Justin Johnson's neural style transfer project(https://github.com/jcjohnson/fast-neural-style)
     """
 
-    def __init__(self, input_nc, output_nc, ngf=64, norm_layer=nn.BatchNorm2d, use_dropout=False, n_blocks=6, padding_type='reflect'):
+    def __init__(self, input_nc, output_nc, ngf=64, norm_layer=nn.BatchNorm2d, use_dropout=False, n_blocks=6, padding_type='reflect', checkpoint_segments=0):
         """Construct a Resnet-based generator
 
         Parameters:
@@ -323,9 +326,13 @@ class ResnetGenerator(nn.Module):
             use_dropout (bool)  -- if use dropout layers
             n_blocks (int)      -- the number of ResNet blocks
             padding_type (str)  -- the name of padding layer in conv layers: reflect | replicate | zero
+            checkpoint_segments (int) -- if > 0, the ResNet blocks are split into this many segments whose
+                                         activations are recomputed during backward instead of being stored
         """
         assert(n_blocks >= 0)
+        assert(checkpoint_segments >= 0)
         super(ResnetGenerator, self).__init__()
+        self.checkpoint_segments = min(checkpoint_segments, n_blocks)
         if type(norm_layer) == functools.partial:
             use_bias = norm_layer.func == nn.InstanceNorm2d
         else:
@@ -344,9 +351,11 @@ class ResnetGenerator(nn.Module):
                       nn.ReLU(True)]
 
         mult = 2 ** n_downsampling
+        self.blocks_start = len(model)  # remember where the ResNet blocks are located in self.model for checkpointing
         for i in range(n_blocks):       # add ResNet blocks
 
             model += [ResnetBlock(ngf * mult, padding_type=padding_type, norm_layer=norm_layer, use_dropout=use_dropout, use_bias=use_bias)]
+        self.blocks_end = len(model)
 
         for i in range(n_downsampling):  # add upsampling layers
             mult = 2 ** (n_downsampling - i)
@@ -363,8 +372,12 @@ class ResnetGenerator(nn.Module):
         self.model = nn.Sequential(*model)
 
     def forward(self, input):
-        """Standard forward"""
-        return self.model(input)
+        """Standard forward; with checkpointing, the ResNet blocks only keep their segment boundaries for backward"""
+        if self.checkpoint_segments == 0 or not torch.is_grad_enabled():
+            return self.model(input)
+        x = self.model[:self.blocks_start](input)
+        x = checkpoint_sequential(self.model[self.blocks_start:self.blocks_end], self.checkpoint_segments, x, use_reentrant=False)
+        return self.model[self.blocks_end:](x)
 
 
 class ResnetBlock(nn.Module):
@@ -430,7 +443,7 @@ class ResnetBlock(nn.Module):
 class UnetGenerator(nn.Module):
     """Create a Unet-based generator"""
 
-    def __init__(self, input_nc, output_nc, num_downs, ngf=64, norm_layer=nn.BatchNorm2d, use_dropout=False):
+    def __init__(self, input_nc, output_nc, num_downs, ngf=64, norm_layer=nn.BatchNorm2d, use_dropout=False, use_checkpoint=False):
         """Construct a Unet generator
         Parameters:
             input_nc (int)  -- the number of channels in input images
@@ -439,20 +452,21 @@ class UnetGenerator(nn.Module):
                                 image of size 128x128 will become of size 1x1 # at the bottleneck
             ngf (int)       -- the number of filters in the last conv layer
             norm_layer      -- normalization layer
+            use_checkpoint (bool) -- if checkpoint the activations of every skip block
 
         We construct the U-Net from the innermost layer to the outermost layer.
         It is a recursive process.
         """
         super(UnetGenerator, self).__init__()
         # construct unet structure
-        unet_block = UnetSkipConnectionBlock(ngf * 8, ngf * 8, input_nc=None, submodule=None, norm_layer=norm_layer, innermost=True)  # add the innermost layer
+        unet_block = UnetSkipConnectionBlock(ngf * 8, ngf * 8, input_nc=None, submodule=None, norm_layer=norm_layer, innermost=True, use_checkpoint=use_checkpoint)  # add the innermost layer
         for i in range(num_downs - 5):          # add intermediate layers with ngf * 8 filters
-            unet_block = UnetSkipConnectionBlock(ngf * 8, ngf * 8, input_nc=None, submodule=unet_block, norm_layer=norm_layer, use_dropout=use_dropout)
+            unet_block = UnetSkipConnectionBlock(ngf * 8, ngf * 8, input_nc=None, submodule=unet_block, norm_layer=norm_layer, use_dropout=use_dropout, use_checkpoint=use_checkpoint)
         # gradually reduce the number of filters from ngf * 8 to ngf
-        unet_block = UnetSkipConnectionBlock(ngf * 4, ngf * 8, input_nc=None, submodule=unet_block, norm_layer=norm_layer)
-        unet_block = UnetSkipConnectionBlock(ngf * 2, ngf * 4, input_nc=None, submodule=unet_block, norm_layer=norm_layer)
-        unet_block = UnetSkipConnectionBlock(ngf, ngf * 2, input_nc=None, submodule=unet_block, norm_layer=norm_layer)
-        self.model = UnetSkipConnectionBlock(output_nc, ngf, input_nc=input_nc, submodule=unet_block, outermost=True, norm_layer=norm_layer)  # add the outermost layer
+        unet_block = UnetSkipConnectionBlock(ngf * 4, ngf * 8, input_nc=None, submodule=unet_block, norm_layer=norm_layer, use_checkpoint=use_checkpoint)
+        unet_block = UnetSkipConnectionBlock(ngf * 2, ngf * 4, input_nc=None, submodule=unet_block, norm_layer=norm_layer, use_checkpoint=use_checkpoint)
+        unet_block = UnetSkipConnectionBlock(ngf, ngf * 2, input_nc=None, submodule=unet_block, norm_layer=norm_layer, use_checkpoint=use_checkpoint)
+        self.model = UnetSkipConnectionBlock(output_nc, ngf, input_nc=input_nc, submodule=unet_block, outermost=True, norm_layer=norm_layer, use_checkpoint=use_checkpoint)  # add the outermost layer
 
     def forward(self, input):
         """Standard forward"""
@@ -466,7 +480,7 @@ class UnetSkipConnectionBlock(nn.Module):
     """
 
     def __init__(self, outer_nc, inner_nc, input_nc=None,
-                 submodule=None, outermost=False, innermost=False, norm_layer=nn.BatchNorm2d, use_dropout=False):
+                 submodule=None, outermost=False, innermost=False, norm_layer=nn.BatchNorm2d, use_dropout=False, use_checkpoint=False):
         """Construct a Unet submodule with skip connections.
 
         Parameters:
@@ -478,9 +492,12 @@ class UnetSkipConnectionBlock(nn.Module):
             innermost (bool)    -- if this module is the innermost module
             norm_layer          -- normalization layer
             user_dropout (bool) -- if use dropout layers.
+            use_checkpoint (bool) -- if recompute the down- and upsampling layers of this block during backward
+                                     instead of storing their activations (the submodule checkpoints itself)
         """
         super(UnetSkipConnectionBlock, self).__init__()
         self.outermost = outermost
+        self.use_checkpoint = use_checkpoint
         if type(norm_layer) == functools.partial:
             use_bias = norm_layer.func == nn.InstanceNorm2d
         else:
@@ -521,12 +538,40 @@ class UnetSkipConnectionBlock(nn.Module):
                 model = down + [submodule] + up
 
         self.model = nn.Sequential(*model)
+        self.submodule_index = model.index(submodule) if submodule is not None else len(model)
 
     def forward(self, x):
+        if self.use_checkpoint and torch.is_grad_enabled():
+            out = self.checkpointed_forward(x)
+        else:
+            out = self.model(x)
         if self.outermost:
-            return self.model(x)
+            return out
         else:   # add skip connections
-            return torch.cat([x, self.model(x)], 1)
+            return torch.cat([x, out], 1)
+
+    def checkpointed_forward(self, x):
+        """Run self.model, checkpointing the layers before and after the submodule as two segments"""
+        out = self.run_segment(self.model[:self.submodule_index], x)
+        if self.submodule_index < len(self.model):
+            out = self.model[self.submodule_index](out)
+            out = self.run_segment(self.model[self.submodule_index + 1:], out)
+        return out
+
+    @staticmethod
+    def run_segment(segment, x):
+        """Run a checkpointed segment of layers.
+
+        A leading in-place activation is applied outside of the checkpoint: it modifies the segment input,
+        which the checkpoint would otherwise need to keep unmodified for the recomputation.
+        (For the down path, this in-place activation is also what the skip connection sees.)
+        """
+        if len(segment) > 0 and getattr(segment[0], 'inplace', False):
+            x = segment[0](x)
+            segment = segment[1:]
+        if len(segment) == 0:
+            return x
+        return checkpoint(segment, x, use_reentrant=False)
 
 
 class NLayerDiscriminator(nn.Module):
@@ -73,9 +73,9 @@ class NightDriveCycleGANModel(BaseModel):
         # The naming is different from those used in the paper.
         # Code (vs. paper): G_A (G), G_B (F), D_A (D_Y), D_B (D_X)
         self.netG_A = networks.define_G(opt.input_nc, opt.output_nc, opt.ngf, opt.netG, opt.norm,
-                                        not opt.no_dropout, opt.init_type, opt.init_gain, self.gpu_ids)
+                                        not opt.no_dropout, opt.init_type, opt.init_gain, self.gpu_ids, opt.checkpoint_segments)
         self.netG_B = networks.define_G(opt.output_nc, opt.input_nc, opt.ngf, opt.netG, opt.norm,
-                                        not opt.no_dropout, opt.init_type, opt.init_gain, self.gpu_ids)
+                                        not opt.no_dropout, opt.init_type, opt.init_gain, self.gpu_ids, opt.checkpoint_segments)
 
         if self.isTrain:  # define discriminators
             self.netD_A = networks.define_D(opt.output_nc, opt.ndf, opt.netD,
@@ -97,6 +97,8 @@ class NightDriveCycleGANModel(BaseModel):
             self.optimizer_D = torch.optim.Adam(itertools.chain(self.netD_A.parameters(), self.netD_B.parameters()), lr=opt.lr, betas=(opt.beta1, 0.999))
             self.optimizers.append(self.optimizer_G)
             self.optimizers.append(self.optimizer_D)
+        # instance norm (or no norm) treats every sample independently, so passes through the same network can share one batch
+        self.batch_passes = opt.norm != 'batch'
 
     def set_input(self, input):
         """Unpack input data from the dataloader and perform necessary pre-processing steps.
@@ -112,56 +114,82 @@ class NightDriveCycleGANModel(BaseModel):
         self.image_paths = input['A_paths' if AtoB else 'B_paths']
 
     def forward(self):
-        """Run forward pass; called by both functions <optimize_parameters> and <test>."""
-        self.fake_B = self.netG_A(self.real_A)  # G_A(A)
+        """Run forward pass; called by both functions <optimize_parameters> and <test>.
+
+        If the identity loss is used, the identity mappings G_A(B) and G_B(A) are computed here as well,
+        in the same generator calls as G_A(A) and G_B(B) (see <run_batched>).
+        """
+        if self.isTrain and self.opt.lambda_identity > 0:
+            self.fake_B, self.idt_A = self.run_batched(self.netG_A, self.real_A, self.real_B)  # G_A(A), G_A(B)
+            self.fake_A, self.idt_B = self.run_batched(self.netG_B, self.real_B, self.real_A)  # G_B(B), G_B(A)
+        else:
+            self.fake_B = self.netG_A(self.real_A)  # G_A(A)
+            self.fake_A = self.netG_B(self.real_B)  # G_B(B)
         self.rec_A = self.netG_B(self.fake_B)   # G_B(G_A(A))
-        self.fake_A = self.netG_B(self.real_B)  # G_B(B)
         self.rec_B = self.netG_A(self.fake_A)   # G_A(G_B(B))
 
-    def backward_D_basic(self, netD, real, fake):
+    def run_batched(self, net, *inputs):
+        """Run a network on several inputs, concatenated along the batch dimension if possible.
+
+        Parameters:
+            net (network)         -- the network to run
+            inputs (tensor array) -- the inputs; they are only concatenated if they have the same shape
+
+        Returns a tuple with the network output for each input.
+        Batch norm computes its statistics across the batch, so with '--norm batch' every input gets a separate call.
+        """
+        if self.batch_passes and all(x.shape == inputs[0].shape for x in inputs[1:]):
+            return net(torch.cat(inputs, 0)).chunk(len(inputs), 0)
+        return tuple(net(x) for x in inputs)
+
+    def backward_D_basic(self, netD, real, fake, name='D'):
         """Calculate GAN loss for the discriminator
 
         Parameters:
             netD (network)      -- the discriminator D
             real (tensor array) -- real images
             fake (tensor array) -- images generated by a generator
+            name (str)          -- name of the discriminator in the timed stages, e.g. 'D_A' for 'D_A_forward'
 
         Return the discriminator loss.
         We also call loss_D.backward() to calculate the gradients.
+        Real and fake images go through the discriminator in one call where the norm layers allow it (see <run_batched>).
         """
-        # Real
-        pred_real = netD(real)
-        loss_D_real = self.criterionGAN(pred_real, True)
-        # Fake
-        pred_fake = netD(fake.detach())
-        loss_D_fake = self.criterionGAN(pred_fake, False)
-        # Combined loss and calculate gradients
-        loss_D = (loss_D_real + loss_D_fake) * 0.5
-        loss_D.backward()
+        with self.timer.stage(name + '_forward'):
+            pred_real, pred_fake = self.run_batched(netD, real, fake.detach())
+            # Real
+            loss_D_real = self.criterionGAN(pred_real, True)
+            # Fake
+            loss_D_fake = self.criterionGAN(pred_fake, False)
+            # Combined loss
+            loss_D = (loss_D_real + loss_D_fake) * 0.5
+        # calculate gradients
+        with self.timer.stage(name + '_backward'):
+            loss_D.backward()
         return loss_D
 
     def backward_D_A(self):
         """Calculate GAN loss for discriminator D_A"""
-        fake_B = self.fake_B_pool.query(self.fake_B)
-        self.loss_D_A = self.backward_D_basic(self.netD_A, self.real_B, fake_B)
+        with self.timer.stage('pool_query_A'):
+            fake_B = self.fake_B_pool.query(self.fake_B)
+        self.loss_D_A = self.backward_D_basic(self.netD_A, self.real_B, fake_B, 'D_A')
 
     def backward_D_B(self):
         """Calculate GAN loss for discriminator D_B"""
-        fake_A = self.fake_A_pool.query(self.fake_A)
-        self.loss_D_B = self.backward_D_basic(self.netD_B, self.real_A, fake_A)
+        with self.timer.stage('pool_query_B'):
+            fake_A = self.fake_A_pool.query(self.fake_A)
+        self.loss_D_B = self.backward_D_basic(self.netD_B, self.real_A, fake_A, 'D_B')
 
     def backward_G(self):
         """Calculate the loss for generators G_A and G_B"""
         lambda_idt = self.opt.lambda_identity
         lambda_A = self.opt.lambda_A
         lambda_B = self.opt.lambda_B
-        # Identity loss
+        # Identity loss (idt_A and idt_B are computed in <forward>)
         if lambda_idt > 0:
             # G_A should be identity if real_B is fed: ||G_A(B) - B||
-            self.idt_A = self.netG_A(self.real_B)
             self.loss_idt_A = self.criterionIdt(self.idt_A, self.real_B) * lambda_B * lambda_idt
             # G_B should be identity if real_A is fed: ||G_B(A) - A||
-            self.idt_B = self.netG_B(self.real_A)
             self.loss_idt_B = self.criterionIdt(self.idt_B, self.real_A) * lambda_A * lambda_idt
         else:
             self.loss_idt_A = 0
@@ -182,15 +210,21 @@ class NightDriveCycleGANModel(BaseModel):
     def optimize_parameters(self):
         """Calculate losses, gradients, and update network weights; called in every training iteration"""
         # forward
-        self.forward()      # compute fake images and reconstruction images.
+        with self.timer.stage('G_forward'):
+            self.forward()      # compute fake images and reconstruction images.
         # G_A and G_B
         self.set_requires_grad([self.netD_A, self.netD_B], False)  # Ds require no gradients when optimizing Gs
         self.optimizer_G.zero_grad()  # set G_A and G_B's gradients to zero
-        self.backward_G()             # calculate gradients for G_A and G_B
-        self.optimizer_G.step()       # update G_A and G_B's weights
+        with self.timer.stage('G_backward'):
+            self.backward_G()             # calculate gradients for G_A and G_B
+        with self.timer.stage('optimizer_G'):
+            self.optimizer_G.step()       # update G_A and G_B's weights
         # D_A and D_B
         self.set_requires_grad([self.netD_A, self.netD_B], True)
         self.optimizer_D.zero_grad()   # set D_A and D_B's gradients to zero
-        self.backward_D_A()      # calculate gradients for D_A
-        self.backward_D_B()      # calculate graidents for D_B
-        self.optimizer_D.step()  # update D_A and D_B's weights
+        with self.timer.range('backward_D_A'):  # only a profiler range, the stages inside are timed
+            self.backward_D_A()      # calculate gradients for D_A
+        with self.timer.range('backward_D_B'):
+            self.backward_D_B()      # calculate graidents for D_B
+        with self.timer.stage('optimizer_D'):
+            self.optimizer_D.step()  # update D_A and D_B's weights
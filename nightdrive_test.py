@@ -86,31 +86,26 @@ from data import create_dataset
 from models import create_model
 from util.visualizer import save_images
 from util import html
-from util.eval_util import save_images_basic, save_images_progress
+from util.eval_util import save_images_basic, save_images_progress, parse_checkpoints
+from util.stage_timer import StageTimer
+from util.profiling import ProfileWindow
+from util.metrics_log import MetricsLog
+from util.gan_metrics import create_gan_metrics
 
 
-if __name__ == '__main__':
-
-    # get test options, parsing user input
-    opt = TestOptions().parse()
-    # hard-code some parameters for test
-    opt.num_threads = 0   # test code only supports num_threads = 1
-    opt.batch_size = 1    # test code only supports batch_size = 1
-    opt.serial_batches = True  # disable data shuffling; comment this line if results on randomly chosen images are needed.
-    opt.no_flip = True    # no flip; comment this line if results on flipped images are needed.
-    opt.display_id = -1   # no visdom display; the test code saves the results to a HTML file.
-    dataset = create_dataset(opt)  # create a dataset given opt.dataset_mode and other options
-    model = create_model(opt)      # create a model given opt.model and other options
-    model.setup(opt)               # regular setup: load and print networks; create schedulers
+def create_outputs(opt, epoch):
+    """Create the web page or the directory the results of checkpoint <epoch> are saved to.
 
-    # set number of test images to "all" if opt.num_test -1
-    if opt.num_test == -1:
-        opt.num_test = len(dataset)
+    Parameters:
+        opt (Option class) -- test options
+        epoch (str)        -- the checkpoint, as shown in the web page title
 
-    # create a website
+    Returns the web page (or None) and the output directory (or None), depending on opt.out_style.
+    """
+    webpage, out_dir = None, None
     if opt.out_style == 'html':
-        web_dir = os.path.join(opt.results_dir, opt.name, '%s_%s' % (opt.phase, opt.epoch))  # define the website directory
-        webpage = html.HTML(web_dir, 'Experiment = %s, Phase = %s, Epoch = %s' % (opt.name, opt.phase, opt.epoch))
+        web_dir = os.path.join(opt.results_dir, opt.name, '%s_%s' % (opt.phase, epoch))  # define the website directory
+        webpage = html.HTML(web_dir, 'Experiment = %s, Phase = %s, Epoch = %s' % (opt.name, opt.phase, epoch))
     elif any([x == opt.out_style for x in ['basic', 'basic_single', 'frames']]):
         out_dir = os.path.join(opt.results_dir)
         if not os.path.exists(out_dir):
@@ -120,35 +115,120 @@ if __name__ == '__main__':
         if not os.path.exists(out_dir):
             os.makedirs(out_dir)
     elif opt.out_style == 'progress':
-        web_dir = os.path.join(opt.results_dir, opt.name, '%s_%s' % (opt.phase, opt.epoch))  # define the website directory
-        webpage = html.HTML(web_dir, 'Epoch eval --- Experiment = %s, Phase = %s, Epoch = %s' % (opt.name, opt.phase, opt.epoch))
+        web_dir = os.path.join(opt.results_dir, opt.name, '%s_%s' % (opt.phase, epoch))  # define the website directory
+        webpage = html.HTML(web_dir, 'Epoch eval --- Experiment = %s, Phase = %s, Epoch = %s' % (opt.name, opt.phase, epoch))
+    return webpage, out_dir
 
-    # test with eval mode. This only affects layers like batchnorm and dropout.
-    #   For [pix2pix]: we use batchnorm and dropout in the original pix2pix. You can experiment it with and without eval() mode.
-    #   For [CycleGAN]: It should not affect CycleGAN as CycleGAN uses instancenorm without dropout.
-    if opt.eval:
-        model.eval()
+
+def test_checkpoint(opt, model, batches, epoch, timer, profiler, step=0, gan_metrics=None):
+    """Run the loaded networks of <model> on <batches> and save the results.
+
+    Parameters:
+        opt (Option class)      -- test options; results are suffixed with opt.out_suffix
+        model (BaseModel)       -- the model, with the networks of the checkpoint loaded
+        batches (iterable)      -- the test data, at most opt.num_test batches are used
+        epoch (str)             -- the checkpoint, see create_outputs
+        timer (StageTimer)      -- marks the stages in the profiler trace
+        profiler (ProfileWindow) -- profiles the iterations given by --profile_iters
+        step (int)              -- number of iterations run before, counted by the profiler
+        gan_metrics (GANMetrics) -- collects the translated images for FID and KID, or None
+
+    Returns the number of iterations run so far.
+    """
+    webpage, out_dir = create_outputs(opt, epoch)
 
     # output results
-    for i, data in enumerate(dataset):
+    for i, data in enumerate(batches):
 
         if i >= opt.num_test:  # only apply our model to opt.num_test images.
             break
 
-        model.set_input(data)  # unpack data from data loader
-        model.test()           # run inference
+        profiler.step(step)
+        step += 1
+        with timer.stage('set_input'):
+            model.set_input(data)  # unpack data from data loader
+        with timer.stage('forward'):
+            model.test()           # run inference
+        if gan_metrics is not None:
+            with timer.stage('fid_features'):
+                gan_metrics.add(model.fake_B)
         visuals = model.get_current_visuals()  # get image results
         img_path = model.get_image_paths()     # get image paths
 
         if i % 10 == 0:  # print progress
             print('processing (%04d)-th image... %s' % (i, img_path))
 
-        if opt.out_style == 'html':  # save images to an HTML file
-            save_images(webpage, visuals, img_path, aspect_ratio=opt.aspect_ratio, width=opt.display_winsize)
-        elif any([opt.out_style == x for x in ['basic', 'basic_single', 'conversion', 'conversion_single', 'frames']]):
-            save_images_basic(opt, data, out_dir, visuals, aspect_ratio=opt.aspect_ratio)
-        elif opt.out_style == 'progress':
-            save_images_progress(webpage, visuals, img_path, aspect_ratio=opt.aspect_ratio, width=opt.display_winsize)
+        with timer.stage('save'):
+            if opt.out_style == 'html':  # save images to an HTML file
+                save_images(webpage, visuals, img_path, aspect_ratio=opt.aspect_ratio, width=opt.display_winsize)
+            elif any([opt.out_style == x for x in ['basic', 'basic_single', 'conversion', 'conversion_single', 'frames']]):
+                save_images_basic(opt, data, out_dir, visuals, aspect_ratio=opt.aspect_ratio)
+            elif opt.out_style == 'progress':
+                save_images_progress(webpage, visuals, img_path, aspect_ratio=opt.aspect_ratio, width=opt.display_winsize)
 
-    if any([x == opt.out_style for x in ['html', 'progress']]):
+    if webpage is not None:
         webpage.save()  # save the HTML
+    return step
+
+
+def report_gan_metrics(opt, gan_metrics, epoch):
+    """Print the FID and KID of the images translated since the last call and append them to [results_dir]/eval_log.jsonl"""
+    scores = gan_metrics.compute()
+    print('checkpoint %s: fid %.4f, kid %.6f +- %.6f (%d images)' % (epoch, scores['fid'], scores['kid'], scores['kid_std'], scores['num_fakes']))
+    MetricsLog(os.path.join(opt.results_dir, 'eval_log.jsonl')).write('eval', checkpoint=epoch, **scores)
+
+
+if __name__ == '__main__':
+
+    # get test options, parsing user input
+    opt = TestOptions().parse()
+    # hard-code some parameters for test
+    opt.num_threads = 0   # test code only supports num_threads = 1
+    opt.batch_size = 1    # test code only supports batch_size = 1
+    opt.serial_batches = True  # disable data shuffling; comment this line if results on randomly chosen images are needed.
+    opt.no_flip = True    # no flip; comment this line if results on flipped images are needed.
+    opt.display_id = -1   # no visdom display; the test code saves the results to a HTML file.
+    # several checkpoints: the networks are created and the first checkpoint is loaded by setup, the others are swapped in below
+    checkpoints = parse_checkpoints(opt.eval_checkpoints, opt.eval_by) if opt.eval_checkpoints else []
+    if checkpoints:
+        opt.epoch, opt.load_iter = checkpoints[0][0], 0
+    dataset = create_dataset(opt)  # create a dataset given opt.dataset_mode and other options
+    model = create_model(opt)      # create a model given opt.model and other options
+    model.setup(opt)               # regular setup: load and print networks; create schedulers
+    timer = StageTimer()           # only used to mark the stages in the profiler trace
+    model.timer = timer
+    profiler = ProfileWindow(opt.profile_iters, model.save_dir, timer)  # torch.profiler over --profile_iters; a no-op by default
+    gan_metrics = create_gan_metrics(opt, model.device)  # FID and KID with --fid_reference; the reference statistics are cached
+
+    # set number of test images to "all" if opt.num_test -1
+    if opt.num_test == -1:
+        opt.num_test = len(dataset)
+
+    # test with eval mode. This only affects layers like batchnorm and dropout.
+    #   For [pix2pix]: we use batchnorm and dropout in the original pix2pix. You can experiment it with and without eval() mode.
+    #   For [CycleGAN]: It should not affect CycleGAN as CycleGAN uses instancenorm without dropout.
+    if opt.eval:
+        model.eval()
+
+    if not checkpoints:
+        test_checkpoint(opt, model, dataset, opt.epoch, timer, profiler, gan_metrics=gan_metrics)
+        if gan_metrics is not None:
+            report_gan_metrics(opt, gan_metrics, opt.epoch)
+    else:
+        # decode the test images once and evaluate every checkpoint on them
+        batches = []
+        for i, data in enumerate(dataset):
+            if i >= opt.num_test:
+                break
+            batches.append(data)
+        out_suffix = opt.out_suffix
+        step = 0
+        for c, (epoch, suffix) in enumerate(checkpoints):
+            if c > 0:
+                model.load_networks(epoch)  # copies the weights into the existing networks
+            opt.out_suffix = out_suffix + suffix
+            step = test_checkpoint(opt, model, batches, epoch, timer, profiler, step, gan_metrics)
+            if gan_metrics is not None:
+                report_gan_metrics(opt, gan_metrics, epoch)
+            print('Successfully processed checkpoint %s.' % epoch)
+    profiler.close()  # save the profile if the test ended inside the profiled iterations
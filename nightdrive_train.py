@@ -22,6 +22,8 @@ from options.train_options import TrainOptions
 from data import create_dataset
 from models import create_model
 from util.visualizer import Visualizer
+from util.stage_timer import StageTimer
+from util.profiling import ProfileWindow
 
 if __name__ == '__main__':
     opt = TrainOptions().parse()   # get training options
@@ -32,6 +34,9 @@ if __name__ == '__main__':
     model = create_model(opt)      # create a model given opt.model and other options
     model.setup(opt)               # regular setup: load and print networks; create schedulers
     visualizer = Visualizer(opt)   # create a visualizer that display/save images and plots
+    timer = StageTimer(opt.timing, opt.timing_sync, opt.timing_window)  # per-stage timing; a no-op without --timing
+    model.timer = timer            # the model times the stages of <optimize_parameters>
+    profiler = ProfileWindow(opt.profile_iters, model.save_dir, timer)  # torch.profiler over --profile_iters; a no-op by default
     total_iters = 0                # the total number of training iterations
 
     for epoch in range(opt.epoch_count, opt.niter + opt.niter_decay + 1):    # outer loop for different epochs; we save the model by <epoch_count>, <epoch_count>+<save_latest_freq>
@@ -41,30 +46,40 @@ if __name__ == '__main__':
 
         for i, data in enumerate(dataset):  # inner loop within one epoch
             iter_start_time = time.time()  # timer for computation per iteration
+            timer.add('data', iter_start_time - iter_data_time)
+            profiler.step(total_iters // opt.batch_size)
             if total_iters % opt.print_freq == 0:
                 t_data = iter_start_time - iter_data_time
             visualizer.reset()
             total_iters += opt.batch_size
             epoch_iter += opt.batch_size
-            model.set_input(data)         # unpack data from dataset and apply preprocessing
+            with timer.stage('set_input'):
+                model.set_input(data)     # unpack data from dataset and apply preprocessing
             model.optimize_parameters()   # calculate loss functions, get gradients, update network weights
+            model.accumulate_losses()     # add the losses to on-device running sums; they are read out every <print_freq> iterations
 
-            if total_iters % opt.display_freq == 0:   # display images on visdom and save images to a HTML file
-                save_result = total_iters % opt.update_html_freq == 0
-                model.compute_visuals()
-                visualizer.display_current_results(model.get_current_visuals(), epoch, save_result)
+            with timer.stage('logging'):
+                if total_iters % opt.display_freq == 0:   # display images on visdom and save images to a HTML file
+                    save_result = total_iters % opt.update_html_freq == 0
+                    model.compute_visuals()
+                    visualizer.display_current_results(model.get_current_visuals(), epoch, save_result)
 
-            if total_iters % opt.print_freq == 0:    # print training losses and save logging information to the disk
-                losses = model.get_current_losses()
-                t_comp = (time.time() - iter_start_time) / opt.batch_size
-                visualizer.print_current_losses(epoch, epoch_iter, losses, t_comp, t_data)
-                if opt.display_id > 0:
-                    visualizer.plot_current_losses(epoch, float(epoch_iter) / dataset_size, losses)
+                if total_iters % opt.print_freq == 0:    # print training losses and save logging information to the disk
+                    losses = model.get_current_losses()  # mean losses since the last print
+                    t_comp = (time.time() - iter_start_time) / opt.batch_size
+                    visualizer.print_current_losses(epoch, epoch_iter, losses, t_comp, t_data, total_iters)
+                    if opt.display_id > 0:
+                        visualizer.plot_current_losses(epoch, float(epoch_iter) / dataset_size, losses)
 
             if total_iters % opt.save_latest_freq == 0:   # cache our latest model every <save_latest_freq> iterations
                 print('saving the latest model (epoch %d, total_iters %d)' % (epoch, total_iters))
                 save_suffix = 'iter_%d' % total_iters if opt.save_by_iter else 'latest'
-                model.save_networks(save_suffix)
+                with timer.stage('save'):
+                    model.save_networks(save_suffix)
+
+            timer.step(opt.batch_size)
+            if opt.timing and total_iters % opt.print_freq == 0:  # print the rolling stage timings
+                visualizer.print_current_timing(epoch, epoch_iter, timer.summary(), total_iters)
 
             iter_data_time = time.time()
         if epoch % opt.save_epoch_freq == 0:              # cache our model every <save_epoch_freq> epochs
@@ -74,3 +89,6 @@ if __name__ == '__main__':
 
         print('End of epoch %d / %d \t Time Taken: %d sec' % (epoch, opt.niter + opt.niter_decay, time.time() - epoch_start_time))
         model.update_learning_rate()                     # update learning rates at the end of every epoch.
+
+    profiler.close()    # save the profile if training ended inside the profiled iterations
+    visualizer.close()  # send the remaining visdom updates
@@ -0,0 +1,218 @@
+"""Checkpoint watcher for continuous evaluation during training in project night-drive.
+
+Run this script next to nightdrive_train.py. It watches --checkpoints_dir/--name for new generator checkpoints
+('<epoch>_net_G_A.pth' or 'iter_<iters>_net_G_A.pth'; another generator with --model_suffix, e.g. _B, while
+'<epoch>_net_G.pth' is watched without suffix if there are such files), and evaluates every new one on a fixed validation set
+that is decoded once at start. The results are appended as rows of kind 'eval' to a JSON lines file
+([checkpoints_dir]/[name]/eval_log.jsonl by default), which can be read with util.metrics_log.read_metrics_log:
+    read_metrics_log('checkpoints/cgan_aws/eval_log.jsonl', kind='eval')
+Checkpoints that are already in the log are skipped, so the watcher can be restarted at any time.
+
+The watcher runs on the CPU with --eval_threads threads by default, so it does not compete with training for the
+GPU; training itself is not changed and does not wait for the evaluation.
+
+Metrics of every checkpoint (averaged over the validation images):
+    l1          -- mean absolute difference between real and translated images, in [0, 2]
+    luma_real   -- mean luminance of the real images, in [-1, 1]
+    luma_fake   -- mean luminance of the translated images, in [-1, 1]
+    night_rate  -- with --classifier_weights: fraction of translated images the time-of-day classifier labels 'night'
+    night_prob  -- with --classifier_weights: mean probability of 'night' for the translated images
+    fid, kid    -- with --fid_reference: FID and KID between the translated images and real night images, see
+                   util/gan_metrics.py; kid_std is the standard deviation of KID over random subsets
+
+Example:
+    python nightdrive_watch.py --name cgan_aws --model test --no_dropout --preprocess none \
+        --dataset_mode deepdrive --dataroot ./datasets/bdd100k_sorted/valid --jsonfile ./datasets/bdd100k_sorted/annotations/bdd100k_sorted_valid \
+        --num_test 10 --eval_threads 2
+
+See options/watch_options.py for the options of the watcher.
+"""
+import os
+import re
+import json
+import time
+import torch
+from options.watch_options import WatchOptions
+from data import create_dataset
+from models import create_model
+from util.metrics_log import MetricsLog
+from util.eval_util import save_images_basic
+from util.gan_metrics import create_gan_metrics
+
+
+def find_checkpoints(save_dir, net_name, settle=0.0, latest=False):
+    """Find the checkpoints of a network in a directory.
+
+    Parameters:
+        save_dir (str) -- directory of the checkpoints, see BaseModel.save_dir
+        net_name (str) -- the network, e.g. 'G_A' for the files '<checkpoint>_net_G_A.pth'
+        settle (float) -- skip files modified less than <settle> seconds ago, they may still be written
+        latest (bool)  -- include the 'latest' checkpoint
+
+    Returns a list of (checkpoint, modification time) sorted by modification time, e.g. [('5', t1), ('iter_20000', t2)].
+    """
+    suffix = '_net_%s.pth' % net_name
+    now = time.time()
+    found = []
+    if not os.path.isdir(save_dir):
+        return found
+    with os.scandir(save_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(suffix):
+                continue
+            checkpoint = entry.name[:-len(suffix)]
+            if checkpoint == 'latest' and not latest:
+                continue
+            mtime = entry.stat().st_mtime
+            if now - mtime >= settle:
+                found.append((checkpoint, mtime))
+    return sorted(found, key=lambda item: item[1])
+
+
+def evaluated_checkpoints(log_path):
+    """Return a dict of the checkpoints in the log at <log_path> and the modification times they were evaluated at
+
+    A last line without newline was left by a watcher killed while writing it; it is removed from the log, so that
+    the next row starts on a line of its own. Other lines that are not valid JSON are skipped.
+    """
+    done = {}
+    if not os.path.exists(log_path):
+        return done
+    with open(log_path, 'rb') as f:
+        lines = f.readlines()
+    if lines and not lines[-1].endswith(b'\n'):
+        print('Removing the incomplete last line of %s' % log_path)
+        with open(log_path, 'r+b') as f:
+            f.truncate(sum(len(line) for line in lines[:-1]))
+        lines = lines[:-1]
+    for line in lines:
+        try:
+            row = json.loads(line)
+        except ValueError:
+            print('Skipping a malformed line of %s' % log_path)
+            continue
+        if row.get('kind') == 'eval':
+            done[row['checkpoint']] = row.get('mtime')
+    return done
+
+
+def checkpoint_progress(checkpoint):
+    """Return the epoch and the iteration of a checkpoint name; unknown values are None"""
+    match = re.fullmatch(r'iter_(\d+)', checkpoint)
+    if match is not None:
+        return None, int(match.group(1))
+    if checkpoint.isdigit():
+        return int(checkpoint), None
+    return None, None
+
+
+def evaluate_checkpoint(opt, model, batches, classifier=None, gan_metrics=None):
+    """Translate the validation batches with the loaded generator and compute the metrics.
+
+    Parameters:
+        opt (Option class)                -- watcher options; with --save_images, the translated images are saved
+        model (BaseModel)                 -- the test model, with the generator of the checkpoint loaded
+        batches (list)                    -- the pre-decoded validation batches
+        classifier (TimeOfDayClassifier)  -- the time-of-day classifier, or None
+        gan_metrics (GANMetrics)          -- FID and KID against the cached reference statistics, or None
+
+    Returns a dict of metrics, see the module docstring.
+    """
+    luma = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+    totals = {'l1': 0.0, 'luma_real': 0.0, 'luma_fake': 0.0}
+    night_probs = []
+    n = 0
+    for data in batches:
+        model.set_input(data)
+        model.test()
+        real, fake = model.real_A.cpu(), model.fake_B.cpu()
+        b = real.shape[0]
+        totals['l1'] += (real - fake).abs().mean().item() * b
+        totals['luma_real'] += (real * luma).sum(1).mean().item() * b
+        totals['luma_fake'] += (fake * luma).sum(1).mean().item() * b
+        n += b
+        if classifier is not None:
+            probs, _ = classifier(fake)
+            night_probs.append(probs[:, classifier.classes.index('night')])
+        if gan_metrics is not None:
+            gan_metrics.add(model.fake_B)
+        if opt.save_images:
+            save_images_basic(opt, data, opt.results_dir, model.get_current_visuals(), aspect_ratio=opt.aspect_ratio)
+    metrics = {k: v / max(n, 1) for k, v in totals.items()}
+    if night_probs:
+        night = torch.cat(night_probs)
+        metrics['night_rate'] = (night > 0.5).float().mean().item()
+        metrics['night_prob'] = night.mean().item()
+    if gan_metrics is not None:
+        scores = gan_metrics.compute()
+        metrics.update(fid=scores['fid'], kid=scores['kid'], kid_std=scores['kid_std'])
+    return metrics
+
+
+if __name__ == '__main__':
+    opt = WatchOptions().parse()  # get watcher options
+    # hard-code some parameters for test
+    opt.num_threads = 0   # the validation set is decoded once, no loader workers are needed
+    opt.batch_size = 1    # test code only supports batch_size = 1
+    opt.serial_batches = True  # always the same validation images
+    opt.no_flip = True    # no flip
+    opt.display_id = -1   # no visdom display
+    torch.set_num_threads(opt.eval_threads)  # CPU thread budget of the evaluation
+    out_suffix = opt.out_suffix
+
+    # decode the validation set once
+    dataset = create_dataset(opt)
+    if opt.num_test == -1:  # all images of the dataset
+        opt.num_test = len(dataset)
+    batches = []
+    for i, data in enumerate(dataset):
+        if i >= opt.num_test:
+            break
+        batches.append(data)
+    print('The validation set has %d images' % len(batches))
+    if opt.save_images and not os.path.exists(opt.results_dir):
+        os.makedirs(opt.results_dir)
+
+    save_dir = os.path.join(opt.checkpoints_dir, opt.name)
+    if opt.model_suffix == '' and not find_checkpoints(save_dir, 'G', latest=True):
+        opt.model_suffix = '_A'  # no single generator G: watch G_A, the day-to-night generator of the CycleGAN models
+    net_name = 'G' + opt.model_suffix
+    log_path = opt.eval_log or os.path.join(save_dir, 'eval_log.jsonl')
+    log = MetricsLog(log_path)
+    done = evaluated_checkpoints(log_path)
+    model, classifier, gan_metrics = None, None, None
+    last_new = time.time()
+    warned = False
+
+    while True:
+        found = find_checkpoints(save_dir, net_name, opt.watch_settle, opt.watch_latest)
+        if not found and not warned:
+            print('Warning: no checkpoint matches %s/*_net_%s.pth yet, see --model_suffix' % (save_dir, net_name))
+            warned = True
+        pending = [(c, mtime) for c, mtime in found if c not in done or (c == 'latest' and done[c] != mtime)]
+        for checkpoint, mtime in pending:
+            if model is None:  # the model is created with the first checkpoint, setup loads it
+                opt.epoch, opt.load_iter = checkpoint, 0
+                model = create_model(opt)
+                model.setup(opt)
+                if opt.eval:
+                    model.eval()
+                if opt.classifier_weights:
+                    from scripts.eval_nightdrive.video_stages import TimeOfDayClassifier
+                    classifier = TimeOfDayClassifier(opt.classifier_weights, model.device)
+                gan_metrics = create_gan_metrics(opt, model.device)
+            else:
+                model.load_networks(checkpoint)  # copies the weights into the existing networks
+            start = time.time()  # after the one-time setup, so that the seconds of all checkpoints are comparable
+            opt.out_suffix = out_suffix + '_' + checkpoint
+            metrics = evaluate_checkpoint(opt, model, batches, classifier, gan_metrics)
+            epoch, iters = checkpoint_progress(checkpoint)
+            log.write('eval', checkpoint=checkpoint, epoch=epoch, iters=iters, mtime=mtime,
+                      seconds=time.time() - start, num_images=len(batches), **metrics)
+            done[checkpoint] = mtime
+            last_new = time.time()
+            print('checkpoint %s: %s' % (checkpoint, ', '.join('%s %.4f' % (k, v) for k, v in metrics.items())))
+
+        if opt.watch_once or (opt.watch_timeout > 0 and time.time() - last_new > opt.watch_timeout):
+            break
+        time.sleep(opt.watch_interval)
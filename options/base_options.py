@@ -37,11 +37,13 @@ class BaseOptions():
         parser.add_argument('--init_type', type=str, default='normal', help='network initialization [normal | xavier | kaiming | orthogonal]')
         parser.add_argument('--init_gain', type=float, default=0.02, help='scaling factor for normal, xavier and orthogonal.')  # @tv this controls the variance of the weight parameters during initialization; reducing this variance can help avoid color inversion
         parser.add_argument('--no_dropout', action='store_true', help='no dropout for the generator (@tv: for cyclegan the default is overwritten in model script to True)')
+        parser.add_argument('--checkpoint_segments', type=int, default=0, help='activation checkpointing for the generators, trading recompute for memory: split the resnet blocks into this many segments (any value > 0 checkpoints every unet skip block); 0 disables it')
         # dataset parameters
         parser.add_argument('--dataset_mode', type=str, default='unaligned', help='chooses how datasets are loaded. [unaligned | aligned | single | colorization]')
         parser.add_argument('--direction', type=str, default='AtoB', help='AtoB or BtoA')
         parser.add_argument('--serial_batches', action='store_true', help='if true, takes images in order to make batches, otherwise takes them randomly')
         parser.add_argument('--num_threads', default=4, type=int, help='# threads for loading data')  # @tv the data loader is multithreaded so that it can use multiple CPU cores to load images
+        parser.add_argument('--prefetch_factor', type=int, default=2, help='# batches loaded in advance by each data loading thread; see scripts/benchmark/bench_dataloader.py to tune it with --num_threads')
         parser.add_argument('--batch_size', type=int, default=1, help='input batch size')
         parser.add_argument('--load_size', type=int, default=286, help='scale images to this size')
         parser.add_argument('--crop_size', type=int, default=256, help='then crop to this size')
@@ -53,28 +55,32 @@ class BaseOptions():
         parser.add_argument('--epoch', type=str, default='latest', help='which epoch to load? set to latest to use latest cached model (note load_iter as presedence)')
         parser.add_argument('--load_iter', type=int, default='0', help='which iteration to load? if load_iter > 0, the code will load models by iter_(i.e., load_iter has precedence of epoch) [load_iter]; otherwise, the code will load models by [epoch]')
         parser.add_argument('--verbose', action='store_true', help='if specified, print more debugging information')
+        parser.add_argument('--profile_iters', type=str, default='', help='profile the iterations start:end (counted from 0, end excluded) with torch.profiler; a Chrome trace and a table of the top operators are saved to [checkpoints_dir]/[name]/')
         parser.add_argument('--suffix', default='', type=str, help='customized suffix: opt.name = opt.name + suffix: e.g., {model}_{netG}_size{load_size}')
         self.initialized = True
         return parser
 
-    def gather_options(self):
+    def gather_options(self, args=None):
         """Initialize our parser with basic options(only once).
         Add additional model-specific and dataset-specific options.
         These options are defined in the <modify_commandline_options> function
         in model and dataset classes.
+
+        Parameters:
+            args (str list) -- the arguments to parse; the command line arguments if None
         """
         if not self.initialized:  # check if it has been initialized
             parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
             parser = self.initialize(parser)
 
         # get the basic options
-        opt, _ = parser.parse_known_args()
+        opt, _ = parser.parse_known_args(args)
 
         # modify model-related parser options
         model_name = opt.model
         model_option_setter = models.get_option_setter(model_name)
         parser = model_option_setter(parser, self.isTrain)
-        opt, _ = parser.parse_known_args()  # parse again with new defaults
+        opt, _ = parser.parse_known_args(args)  # parse again with new defaults
 
         # modify dataset-related parser options
         dataset_name = opt.dataset_mode
@@ -83,7 +89,7 @@ class BaseOptions():
 
         # save and return the parser
         self.parser = parser
-        return parser.parse_args()
+        return parser.parse_args(args)
 
     def print_options(self, opt):
         """Print and save options
@@ -110,9 +116,14 @@ class BaseOptions():
             opt_file.write(message)
             opt_file.write('\n')
 
-    def parse(self):
-        """Parse our options, create checkpoints directory suffix, and set up gpu device."""
-        opt = self.gather_options()
+    def parse(self, args=None):
+        """Parse our options, create checkpoints directory suffix, and set up gpu device.
+
+        Parameters:
+            args (str list) -- the arguments to parse, e.g. to create a model from within another script;
+                               the command line arguments if None
+        """
+        opt = self.gather_options(args)
         opt.isTrain = self.isTrain   # train or test
 
         # process opt.suffix
@@ -37,11 +37,13 @@ class BaseOptions():
         parser.add_argument('--init_type', type=str, default='normal', help='network initialization [normal | xavier | kaiming | orthogonal]')
         parser.add_argument('--init_gain', type=float, default=0.02, help='scaling factor for normal, xavier and orthogonal.')
         parser.add_argument('--no_dropout', action='store_true', help='no dropout for the generator')
+        parser.add_argument('--checkpoint_segments', type=int, default=0, help='activation checkpointing for the generators, trading recompute for memory: split the resnet blocks into this many segments (any value > 0 checkpoints every unet skip block); 0 disables it')
         # dataset parameters
         parser.add_argument('--dataset_mode', type=str, default='unaligned', help='chooses how datasets are loaded. [unaligned | aligned | single | colorization]')
         parser.add_argument('--direction', type=str, default='AtoB', help='AtoB or BtoA')
         parser.add_argument('--serial_batches', action='store_true', help='if true, takes images in order to make batches, otherwise takes them randomly')
         parser.add_argument('--num_threads', default=4, type=int, help='# threads for loading data')
+        parser.add_argument('--prefetch_factor', type=int, default=2, help='# batches loaded in advance by each data loading thread; see scripts/benchmark/bench_dataloader.py to tune it with --num_threads')
         parser.add_argument('--batch_size', type=int, default=1, help='input batch size')
         parser.add_argument('--load_size', type=int, default=1200, help='scale images to this size')
         parser.add_argument('--crop_size', type=int, default=360, help='then crop to this size')
@@ -53,6 +55,7 @@ class BaseOptions():
         parser.add_argument('--epoch', type=str, default='latest', help='which epoch to load? set to latest to use latest cached model')
         parser.add_argument('--load_iter', type=int, default='0', help='which iteration to load? if load_iter > 0, the code will load models by iter_[load_iter]; otherwise, the code will load models by [epoch]')
         parser.add_argument('--verbose', action='store_true', help='if specified, print more debugging information')
+        parser.add_argument('--profile_iters', type=str, default='', help='profile the iterations start:end (counted from 0, end excluded) with torch.profiler; a Chrome trace and a table of the top operators are saved to [checkpoints_dir]/[name]/')
         parser.add_argument('--suffix', default='', type=str, help='customized suffix: opt.name = opt.name + suffix: e.g., {model}_{netG}_size{load_size}')
         self.initialized = True
         return parser
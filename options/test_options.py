@@ -22,6 +22,16 @@ class TestOptions(BaseOptions):
         # Dropout and Batchnorm has different behavioir during training and test.
         parser.add_argument('--eval', action='store_true', help='use eval mode during test time.')  # see https://github.com/junyanz/pytorch-CycleGAN-and-pix2pix/issues/285: Currently .eval() is not being used. I added it just in case others would like to use it. It should not affect CycleGAN model at all as CycleGAN has no dropout and batchnorm. It might affect pix2pix model. But we found that pix2pix can produce more diverse results when using dropout during the test time. You are free to try it for your own test code.
         parser.add_argument('--num_test', type=int, default=50, help='how many test images to run [-1 tests on all images in dataset]')
+        # Evaluation of several checkpoints in one run
+        parser.add_argument('--eval_checkpoints', type=str, default='', help='evaluate several checkpoints on the same test images, e.g. "5,10,latest" or "130000:150000:5000" (inclusive range start:stop:step); overrides --epoch and --load_iter')
+        parser.add_argument('--eval_by', type=str, default='epoch', choices=['epoch', 'iter'], help='whether --eval_checkpoints are epochs or iterations; outputs are suffixed with "_epoch_<epoch>" or "_iter_<iter>"')
+        # FID and KID of the translated images, see util/gan_metrics.py
+        parser.add_argument('--fid_reference', type=str, default='', help='directory of real images of the target domain (e.g. night images); if given, FID and KID of the translated images are computed')
+        parser.add_argument('--fid_weights', type=str, default='', help='local checkpoint of the feature extractor (torchvision state dict); required with --fid_reference')
+        parser.add_argument('--fid_arch', type=str, default='inception_v3', choices=['inception_v3', 'resnet18', 'resnet50'], help='architecture of the feature extractor')
+        parser.add_argument('--fid_cache_dir', type=str, default='', help='directory of the cached reference statistics [default: [checkpoints_dir]/fid_cache]')
+        parser.add_argument('--fid_batch_size', type=int, default=32, help='number of images per forward pass of the feature extractor')
+        parser.add_argument('--fid_max_reference', type=int, default=10000, help='use at most this many reference images')
         # rewrite devalue values
         parser.set_defaults(model='test')
         # To avoid cropping, the load_size should be the same as crop_size
@@ -16,9 +16,14 @@ class TrainOptions(BaseOptions):
         parser.add_argument('--display_server', type=str, default="http://localhost", help='visdom server of the web display')
         parser.add_argument('--display_env', type=str, default='main', help='visdom display environment name (default is "main")')
         parser.add_argument('--display_port', type=int, default=8097, help='visdom port of the web display')
+        parser.add_argument('--display_queue_size', type=int, default=2, help='maximum number of image frames waiting to be sent to visdom; older frames are dropped')
         parser.add_argument('--update_html_freq', type=int, default=1000, help='frequency of saving training results to html [unit iter]')
         parser.add_argument('--print_freq', type=int, default=100, help='frequency of showing training results on console [unit iter]')
+        parser.add_argument('--timing', action='store_true', help='time the stages of every training iteration and print rolling percentiles and images/sec every <print_freq> iterations')
+        parser.add_argument('--timing_sync', action='store_true', help='synchronize the GPU around every timed stage; attributes GPU time to the right stage but slows down training')
+        parser.add_argument('--timing_window', type=int, default=100, help='number of recent iterations used for the timing percentiles')
         parser.add_argument('--no_html', action='store_true', help='do not save intermediate training results to [opt.checkpoints_dir]/[opt.name]/web/')
+        parser.add_argument('--html_epochs_per_page', type=int, default=10, help='number of epochs per page of the HTML report; only the page of the current epoch is rewritten')
         # network saving and loading parameters (see also base_options "additional parameters" for continue train options)
         parser.add_argument('--save_latest_freq', type=int, default=5000, help='frequency of saving the latest results [unit iter]')
         parser.add_argument('--save_epoch_freq', type=int, default=5, help='frequency of saving checkpoints at the end of epochs [unit epoch]')
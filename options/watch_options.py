@@ -0,0 +1,23 @@
+from .test_options import TestOptions
+
+
+class WatchOptions(TestOptions):
+    """This class includes the options of the checkpoint watcher (nightdrive_watch.py).
+
+    It also includes the test options defined in TestOptions.
+    """
+
+    def initialize(self, parser):
+        parser = TestOptions.initialize(self, parser)  # define shared options
+        parser.add_argument('--watch_interval', type=float, default=30.0, help='seconds between two checks for new checkpoints')
+        parser.add_argument('--watch_settle', type=float, default=10.0, help='only evaluate checkpoints that have not been modified for this many seconds, so files being written are skipped')
+        parser.add_argument('--watch_timeout', type=float, default=0, help='stop after this many seconds without a new checkpoint; 0 watches until interrupted')
+        parser.add_argument('--watch_once', action='store_true', help='evaluate the checkpoints present now and stop')
+        parser.add_argument('--watch_latest', action='store_true', help='also evaluate the "latest" checkpoint whenever it changes')
+        parser.add_argument('--eval_threads', type=int, default=2, help='number of CPU threads used by the evaluation, so that it does not slow down training')
+        parser.add_argument('--eval_log', type=str, default='', help='JSON lines file the results are appended to [default: [checkpoints_dir]/[name]/eval_log.jsonl]')
+        parser.add_argument('--save_images', action='store_true', help='save the translated images of every checkpoint to --results_dir, suffixed with the checkpoint')
+        parser.add_argument('--classifier_weights', type=str, default='', help='checkpoint of the ResNet-18 time-of-day classifier; if given, the fraction of translated images classified as night is reported')
+        # the watcher runs next to training: use the CPU and a small, fixed validation set by default
+        parser.set_defaults(gpu_ids='-1', num_test=10, out_style='conversion_single', phase='test')
+        return parser
@@ -0,0 +1,154 @@
+"""Throughput benchmark and tuner for the data loading pipeline.
+
+The data loader (data.CustomDatasetDataLoader) is run alone, without a model, for every combination of
+--num_threads, --batch_size, --prefetch_factor and --preprocess given as lists. For each configuration, the script
+reports samples/sec, the time to the first batch, the CPU time of the main process and its workers and the memory
+(RSS) of the workers. It then recommends the fastest --num_threads / --prefetch_factor for every batch size and
+preprocess mode; configurations within --tolerance of the fastest count as equally fast and the one with the fewest
+threads wins. The recommendation is printed as command line flags and saved to --output.
+
+All unknown arguments are passed on to the training options (options/train_options.py), so the data set is set up
+exactly as for training, e.g. --dataroot, --dataset_mode, --jsonfile, --load_size, --crop_size.
+Benchmark options:
+    --num_threads_list       data loading threads to try (default 0 2 4 8)
+    --batch_size_list        batch sizes to try (default --batch_size)
+    --prefetch_factor_list   prefetch factors to try (default --prefetch_factor)
+    --preprocess_list        preprocess modes to try (default --preprocess)
+    --batches                number of batches loaded per configuration (default 50)
+    --tolerance              relative slowdown still considered as fast as the best (default 0.05)
+    --output                 save the results and the recommendation to this JSON file
+
+Worker CPU and memory are measured with psutil if it is installed; otherwise only the total CPU time is reported.
+
+Example:
+    python -m scripts.benchmark.bench_dataloader --dataroot /data/bdd100k_sorted/train_A/ --dataset_mode deepdrive
+        --jsonfile /data/bdd100k_sorted/train_A/bdd100k_sorted_train_A --num_threads_list 2 4 8 12 --prefetch_factor_list 2 4
+"""
+import copy
+import time
+import json
+import argparse
+import resource
+from data import CustomDatasetDataLoader
+from scripts.benchmark import bench_util
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def parse_options():
+    """Return the benchmark options and the training options"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--num_threads_list', type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('--batch_size_list', type=int, nargs='+', default=None)
+    parser.add_argument('--prefetch_factor_list', type=int, nargs='+', default=None)
+    parser.add_argument('--preprocess_list', nargs='+', default=None)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=0.05)
+    parser.add_argument('--output', type=str, default='')
+    # do not overwrite the opt.txt of an experiment; the data loader runs without a model, so no GPU is needed
+    bench_opt, opt = bench_util.parse_train_options(parser, {'--name': 'bench_dataloader', '--gpu_ids': '-1'})
+    bench_opt.batch_size_list = bench_opt.batch_size_list or [opt.batch_size]
+    bench_opt.prefetch_factor_list = bench_opt.prefetch_factor_list or [opt.prefetch_factor]
+    bench_opt.preprocess_list = bench_opt.preprocess_list or [opt.preprocess]
+    return bench_opt, opt
+
+
+def cpu_seconds():
+    """Return the CPU time used by this process and its terminated children so far"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def worker_usage(process):
+    """Return the summed RSS (MB) and CPU time (s) of the living child processes, or (None, None) without psutil"""
+    if psutil is None:
+        return None, None
+    rss, cpu = 0, 0.0
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+            times = child.cpu_times()
+            cpu += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass
+    return rss / 2 ** 20, cpu
+
+
+def bench_config(opt, num_batches):
+    """Load <num_batches> batches with the data loader configured by <opt> and return the measurements"""
+    process = psutil.Process() if psutil is not None else None
+    cpu_start = cpu_seconds()
+    start = time.perf_counter()
+    loader = CustomDatasetDataLoader(opt)
+    first_batch = None
+    samples = 0
+    worker_rss, worker_cpu = None, None
+    i = -1
+    for i, data in enumerate(loader):
+        if first_batch is None:
+            first_batch = time.perf_counter()
+        else:
+            samples += data['A'].size(0)
+        if i + 1 == num_batches:
+            worker_rss, worker_cpu = worker_usage(process)  # the workers are still alive here
+            break
+    end = time.perf_counter()
+    del loader  # shut the workers down, so that their CPU time is included in RUSAGE_CHILDREN
+    result = {'num_threads': opt.num_threads, 'batch_size': opt.batch_size, 'prefetch_factor': opt.prefetch_factor,
+              'preprocess': opt.preprocess, 'batches': i + 1,
+              'startup_sec': first_batch - start if first_batch is not None else None,
+              'samples_per_sec': samples / (end - first_batch) if samples else 0.0,  # steady state, after the first batch
+              'cpu_sec': cpu_seconds() - cpu_start, 'worker_cpu_sec': worker_cpu, 'worker_rss_mb': worker_rss}
+    return result
+
+
+def recommend(results, tolerance):
+    """Return the recommended num_threads and prefetch_factor for every (batch_size, preprocess) combination"""
+    recommendations = []
+    groups = sorted(set((r['batch_size'], r['preprocess']) for r in results))
+    for batch_size, preprocess in groups:
+        group = [r for r in results if r['batch_size'] == batch_size and r['preprocess'] == preprocess]
+        best = max(r['samples_per_sec'] for r in group)
+        fast = [r for r in group if r['samples_per_sec'] >= best * (1 - tolerance)]
+        choice = min(fast, key=lambda r: (r['num_threads'], r['prefetch_factor'], -r['samples_per_sec']))
+        recommendations.append({'batch_size': batch_size, 'preprocess': preprocess, 'num_threads': choice['num_threads'],
+                                'prefetch_factor': choice['prefetch_factor'], 'samples_per_sec': choice['samples_per_sec']})
+    return recommendations
+
+
+def main():
+    bench_opt, opt = parse_options()
+    results = []
+    for preprocess in bench_opt.preprocess_list:
+        for batch_size in bench_opt.batch_size_list:
+            for num_threads in bench_opt.num_threads_list:
+                for prefetch_factor in bench_opt.prefetch_factor_list:
+                    if num_threads == 0 and prefetch_factor != bench_opt.prefetch_factor_list[0]:
+                        continue  # no prefetching without worker threads
+                    config = copy.copy(opt)
+                    config.preprocess, config.batch_size = preprocess, batch_size
+                    config.num_threads, config.prefetch_factor = num_threads, prefetch_factor
+                    r = bench_config(config, bench_opt.batches)
+                    rss = '%.0fMB' % r['worker_rss_mb'] if r['worker_rss_mb'] is not None else '-'
+                    print('preprocess %-22s batch %3d  threads %2d  prefetch %2d : %8.1f samples/s  startup %5.1fs  cpu %6.1fs  workers %s'
+                          % (preprocess, batch_size, num_threads, prefetch_factor, r['samples_per_sec'], r['startup_sec'] or 0, r['cpu_sec'], rss))
+                    results.append(r)
+
+    recommendations = recommend(results, bench_opt.tolerance)
+    print('recommended settings for this host:')
+    for rec in recommendations:
+        print('    --preprocess %s --batch_size %d : --num_threads %d --prefetch_factor %d  (%.1f samples/s)'
+              % (rec['preprocess'], rec['batch_size'], rec['num_threads'], rec['prefetch_factor'], rec['samples_per_sec']))
+    if bench_opt.output:
+        with open(bench_opt.output, 'w') as f:
+            json.dump({'dataset_mode': opt.dataset_mode, 'dataroot': opt.dataroot, 'results': results,
+                       'recommendations': recommendations}, f, indent=2)
+        print('saved the results to %s' % bench_opt.output)
+
+
+if __name__ == '__main__':
+    main()
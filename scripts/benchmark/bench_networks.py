@@ -0,0 +1,150 @@
+"""Micro-benchmark for the generators and discriminators in models/networks.py.
+
+Every combination of network, batch size, resolution, norm, thread count and precision is built with
+<define_G> / <define_D> and run on random input. For each configuration, the latency distribution, the throughput
+and the peak memory are printed and optionally saved as JSON. With --baseline, the run is compared to an earlier
+result file, and the script exits with status 1 if a configuration got slower by more than --threshold.
+
+Configurations the network cannot run are skipped, e.g. unet_256 needs a height and width divisible by 256.
+
+Example:
+    Time all generators at 256x256 and 720x1280 in inference, and save the results:
+        python -m scripts.benchmark.bench_networks --netD --resolutions 256 720x1280 --output bench_G.json
+    Time the default discriminator training step on the GPU with mixed precision, against a baseline:
+        python -m scripts.benchmark.bench_networks --netG --netD basic --mode train --precisions fp32 fp16 --gpu_ids 0 --baseline bench_D.json
+"""
+import sys
+import argparse
+import torch
+from models import networks
+from scripts.benchmark import bench_util
+
+
+def parse_resolution(spec):
+    """Parse '256' or '720x1280' (height x width) into a (height, width) tuple"""
+    if 'x' in spec:
+        h, w = spec.split('x')
+        return int(h), int(w)
+    return int(spec), int(spec)
+
+
+def input_multiple(net_name):
+    """Return the number the input height and width need to be a multiple of for the network <net_name>"""
+    if net_name.startswith('unet_'):
+        return int(net_name[len('unet_'):])  # one down-sampling per level; unet_256 has 8 levels
+    if net_name.startswith('resnet_'):
+        return 4  # two stride-2 convolutions and two transposed convolutions
+    return 1
+
+
+def build_net(kind, net_name, norm, opt, device):
+    """Create a generator (kind 'G') or discriminator (kind 'D') with random weights on <device>"""
+    if kind == 'G':
+        net = networks.define_G(3, 3, opt.ngf, net_name, norm=norm, use_dropout=False, checkpoint_segments=opt.checkpoint_segments)
+    else:
+        net = networks.define_D(3, opt.ndf, net_name, n_layers_D=opt.n_layers_D, norm=norm)
+    return net.to(device)
+
+
+def bench_config(net, kind, net_name, batch_size, resolution, norm, threads, precision, opt, device):
+    """Benchmark one configuration and return its result dict"""
+    h, w = resolution
+    key = '%s/%s/bs%d/%dx%d/%s/t%d/%s/%s' % (kind, net_name, batch_size, h, w, norm, threads, precision, opt.mode)
+    result = {'key': key, 'kind': kind, 'net': net_name, 'batch_size': batch_size, 'height': h, 'width': w,
+              'norm': norm, 'threads': threads, 'precision': precision, 'mode': opt.mode}
+    multiple = input_multiple(net_name) if kind == 'G' else 1
+    if h % multiple or w % multiple:
+        result['error'] = 'skipped: %s needs a size divisible by %d' % (net_name, multiple)
+        return result
+    if precision == 'fp16' and device.type != 'cuda':
+        result['error'] = 'skipped: fp16 needs a GPU'
+        return result
+    if norm == 'batch' and batch_size == 1 and opt.mode == 'train':
+        result['error'] = 'skipped: batch norm needs a batch size > 1 in training'
+        return result
+
+    torch.set_num_threads(threads)
+    x = torch.randn(batch_size, 3, h, w, device=device)
+    if opt.mode == 'train':
+        net.train()
+
+        def step():
+            with bench_util.autocast(device, precision):
+                out = net(x)
+            out.float().mean().backward()
+            net.zero_grad(set_to_none=True)
+    else:
+        net.eval()
+
+        def step():
+            with torch.no_grad(), bench_util.autocast(device, precision):
+                net(x)
+
+    bench_util.reset_peak_memory(device)
+    try:
+        times = bench_util.measure(step, device, opt.warmup, opt.iters)
+    except RuntimeError as e:  # mostly out of memory; keep going with the other configurations
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+        result['error'] = 'failed: %s' % str(e).split('\n')[0]
+        return result
+    result['latency_ms'] = bench_util.latency_stats(times)
+    result['images_per_sec'] = batch_size * 1000 / result['latency_ms']['mean']
+    result['peak_memory_mb'] = bench_util.peak_memory_mb(device)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--netG', nargs='*', default=['resnet_9blocks', 'resnet_6blocks', 'unet_256', 'unet_128'], help='generator architectures; pass no value to skip generators')
+    parser.add_argument('--netD', nargs='*', default=['basic', 'n_layers', 'pixel'], help='discriminator architectures; pass no value to skip discriminators')
+    parser.add_argument('--batch_sizes', nargs='+', type=int, default=[1, 4], help='input batch sizes')
+    parser.add_argument('--resolutions', nargs='+', default=['256', '360', '720x1280'], help='input sizes as <size> or <height>x<width>')
+    parser.add_argument('--norms', nargs='+', default=['instance', 'batch'], help='normalization layers [instance | batch | none]')
+    parser.add_argument('--threads', nargs='+', type=int, default=[torch.get_num_threads()], help='numbers of intra-op CPU threads')
+    parser.add_argument('--precisions', nargs='+', default=['fp32'], help='precisions [fp32 | fp16 | bf16]; fp16 and bf16 run under autocast')
+    parser.add_argument('--mode', type=str, default='inference', help='inference: forward pass without gradients | train: forward and backward pass')
+    parser.add_argument('--ngf', type=int, default=64, help='# of gen filters in the last conv layer')
+    parser.add_argument('--ndf', type=int, default=64, help='# of discrim filters in the first conv layer')
+    parser.add_argument('--n_layers_D', type=int, default=3, help='only used if netD==n_layers')
+    parser.add_argument('--checkpoint_segments', type=int, default=0, help='gradient checkpointing of the generators, see --checkpoint_segments in options/base_options.py')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed runs per configuration')
+    parser.add_argument('--iters', type=int, default=10, help='timed runs per configuration')
+    parser.add_argument('--gpu_ids', type=int, nargs='+', default=[-1], help='gpu id to run on; -1 for CPU')
+    parser.add_argument('--output', type=str, default='', help='save the results to this JSON file')
+    parser.add_argument('--baseline', type=str, default='', help='compare the results to this JSON file')
+    parser.add_argument('--metric', type=str, default='p50', help='latency statistic used for the comparison [p50 | p90 | mean | min]')
+    parser.add_argument('--threshold', type=float, default=0.05, help='relative slowdown that counts as a regression')
+    opt = parser.parse_args()
+
+    device = bench_util.get_device(opt.gpu_ids)
+    torch.backends.cudnn.benchmark = True
+    env = bench_util.environment(device)
+    print('benchmarking on %s (torch %s)' % (env['device'], env['torch']))
+    resolutions = [parse_resolution(r) for r in opt.resolutions]
+
+    results = []
+    for kind, net_names in (('G', opt.netG), ('D', opt.netD)):
+        for net_name in net_names:
+            for norm in opt.norms:
+                net = build_net(kind, net_name, norm, opt, device)
+                for resolution in resolutions:
+                    for batch_size in opt.batch_sizes:
+                        for threads in opt.threads:
+                            for precision in opt.precisions:
+                                r = bench_config(net, kind, net_name, batch_size, resolution, norm, threads, precision, opt, device)
+                                bench_util.print_result(r)
+                                results.append(r)
+                del net
+
+    if opt.output:
+        bench_util.save_results(opt.output, results, env)
+    if opt.baseline:
+        regressions = bench_util.compare_results(results, bench_util.load_results(opt.baseline), opt.metric, opt.threshold)
+        if regressions:
+            print('%d configurations regressed by more than %.0f%%' % (len(regressions), opt.threshold * 100))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""End-to-end benchmark of the CycleGAN training step on synthetic data.
+
+The model is built exactly as in nightdrive_train.py, from the regular training options, and random batches
+are fed through <set_input> and <optimize_parameters>; no data set is needed. The script reports steps/sec, images/sec,
+the latency distribution of a whole step, the peak memory and the per-stage breakdown of util/stage_timer.py.
+With --baseline, the run is compared to an earlier result file, and the script exits with status 1 on a regression.
+
+All unknown arguments are passed on to the training options (options/train_options.py), so every training
+setting can be benchmarked, e.g. --netG, --norm, --crop_size, --batch_size, --lambda_identity, --checkpoint_segments.
+Benchmark options:
+    --steps       number of timed training steps (default 20)
+    --warmup      number of untimed steps first (default 3)
+    --height      height of the synthetic images (default --crop_size)
+    --width       width of the synthetic images (default --crop_size)
+    --output      save the result to this JSON file
+    --baseline    compare to this JSON file
+    --threshold   relative slowdown that counts as a regression (default 0.05)
+
+Example:
+    python -m scripts.benchmark.bench_train_step --gpu_ids 0 --batch_size 1 --crop_size 360 --steps 50 --output step.json
+"""
+import sys
+import argparse
+from models import create_model
+from util.stage_timer import StageTimer
+from scripts.benchmark import bench_util
+
+
+def parse_options():
+    """Return the benchmark options and the training options"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--height', type=int, default=0)
+    parser.add_argument('--width', type=int, default=0)
+    parser.add_argument('--output', type=str, default='')
+    parser.add_argument('--baseline', type=str, default='')
+    parser.add_argument('--threshold', type=float, default=0.05)
+    bench_opt, opt = bench_util.parse_train_options(parser, bench_util.synthetic_defaults('bench_train_step'))
+    bench_opt.height = bench_opt.height or opt.crop_size
+    bench_opt.width = bench_opt.width or opt.crop_size
+    return bench_opt, opt
+
+
+def main():
+    bench_opt, opt = parse_options()
+    model = create_model(opt)
+    model.setup(opt)
+    device = model.device
+    batches = bench_util.synthetic_batches(opt, bench_opt.height, bench_opt.width)
+    count = [0]
+
+    def step():
+        with model.timer.stage('set_input'):
+            model.set_input(batches[count[0] % len(batches)])
+        model.optimize_parameters()
+        model.accumulate_losses()
+        count[0] += 1
+
+    for _ in range(bench_opt.warmup):
+        step()
+    model.timer = StageTimer(True, opt.timing_sync, bench_opt.steps)  # only time the steps after the warm-up
+    bench_util.reset_peak_memory(device)
+    times = bench_util.measure(step, device, warmup=0, iters=bench_opt.steps)
+    model.get_current_losses()  # read the accumulated losses, as the training loop does
+
+    result = {'key': 'train_step/%s/%s/bs%d/%dx%d/%s' % (opt.netG, opt.netD, opt.batch_size, bench_opt.height, bench_opt.width, opt.norm),
+              'netG': opt.netG, 'netD': opt.netD, 'batch_size': opt.batch_size, 'height': bench_opt.height, 'width': bench_opt.width,
+              'norm': opt.norm, 'lambda_identity': opt.lambda_identity, 'checkpoint_segments': opt.checkpoint_segments,
+              'latency_ms': bench_util.latency_stats(times)}
+    result['steps_per_sec'] = 1000 / result['latency_ms']['mean']
+    result['images_per_sec'] = result['steps_per_sec'] * opt.batch_size
+    result['peak_memory_mb'] = bench_util.peak_memory_mb(device)
+    result['stages_ms'] = {k[:-len('_mean')]: v * 1000 for k, v in model.timer.summary().items() if k.endswith('_mean')}
+
+    bench_util.print_result(result)
+    print('%.2f steps/sec' % result['steps_per_sec'])
+    for stage, ms in result['stages_ms'].items():
+        print('    %-14s %8.2fms' % (stage, ms))
+
+    if bench_opt.output:
+        bench_util.save_results(bench_opt.output, [result], bench_util.environment(device))
+    if bench_opt.baseline:
+        if bench_util.compare_results([result], bench_util.load_results(bench_opt.baseline), threshold=bench_opt.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""This module contains helper functions shared by the benchmark scripts in scripts/benchmark/.
+
+A benchmark result file is a JSON object
+    {"environment": {...}, "results": [{"key": "...", "latency_ms": {...}, "images_per_sec": ..., ...}, ...]}
+Results are matched between two files by their "key", see <compare_results>.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import numpy as np
+import torch
+
+
+def parse_train_options(parser, defaults=None):
+    """Parse the benchmark options of <parser> and pass all other command line arguments on to the training options.
+
+    Parameters:
+        parser (ArgumentParser) -- the benchmark-specific options
+        defaults (dict)         -- training arguments used if not given on the command line, e.g. {'--name': 'bench'};
+                                   a value of None adds a flag without value
+
+    Returns the benchmark options and the training options (options/train_options.py).
+    """
+    from options.train_options import TrainOptions
+    bench_opt, train_args = parser.parse_known_args()
+    for flag, value in (defaults or {}).items():
+        if flag not in train_args:
+            train_args += [flag] if value is None else [flag, value]
+    sys.argv = sys.argv[:1] + train_args
+    return bench_opt, TrainOptions().parse()
+
+
+def synthetic_defaults(name):
+    """Return the training arguments that make the options work without a data set, for <parse_train_options>"""
+    defaults = {'--dataroot': 'synthetic', '--name': name, '--model': 'nightdrivecyclegan',
+                '--dataset_mode': 'single', '--display_id': '0', '--no_html': None}
+    if not torch.cuda.is_available():
+        defaults['--gpu_ids'] = '-1'
+    return defaults
+
+
+def synthetic_batches(opt, height, width, num_batches=4):
+    """Return a few random batches in the format of the data loader, with values in [-1, 1] like the normalized images"""
+    batches = []
+    for i in range(num_batches):
+        batches.append({'A': torch.rand(opt.batch_size, opt.input_nc, height, width) * 2 - 1,
+                        'B': torch.rand(opt.batch_size, opt.output_nc, height, width) * 2 - 1,
+                        'A_paths': ['synthetic_A_%d.jpg' % i] * opt.batch_size,
+                        'B_paths': ['synthetic_B_%d.jpg' % i] * opt.batch_size})
+    return batches
+
+
+def get_device(gpu_ids):
+    """Return the torch device for a list of gpu ids ([] or [-1] means CPU)"""
+    gpu_ids = [i for i in gpu_ids if i >= 0]
+    if gpu_ids and torch.cuda.is_available():
+        torch.cuda.set_device(gpu_ids[0])
+        return torch.device('cuda:%d' % gpu_ids[0])
+    return torch.device('cpu')
+
+
+def synchronize(device):
+    """Wait for all queued work on <device>"""
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def measure(fn, device, warmup=3, iters=10):
+    """Run <fn> repeatedly and return the wall time of every run in seconds.
+
+    Parameters:
+        fn (callable)         -- the code to benchmark; called without arguments
+        device (torch.device) -- the device <fn> runs on; it is synchronized around every run
+        warmup (int)          -- the number of untimed runs first (cudnn autotuning, allocator warm-up)
+        iters (int)           -- the number of timed runs
+    """
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+    times = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def latency_stats(times):
+    """Summarize a list of run times (in seconds) as a dict of latencies in milliseconds"""
+    ms = np.array(times) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {'mean': float(ms.mean()), 'std': float(ms.std()), 'min': float(ms.min()),
+            'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(ms.max())}
+
+
+def reset_peak_memory(device):
+    """Reset the peak memory counter of <device>; no-op on CPU"""
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+
+
+def peak_memory_mb(device):
+    """Return the peak memory in MB: allocated tensor memory on a GPU, the peak resident set size of the process on CPU.
+
+    The CPU value is the high-water mark of the whole process, so it never goes down between configurations.
+    """
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def autocast(device, precision):
+    """Return an autocast context for <precision> (fp32 | fp16 | bf16) on <device>"""
+    if precision == 'fp32':
+        return torch.autocast(device.type, enabled=False)
+    dtype = {'fp16': torch.float16, 'bf16': torch.bfloat16}[precision]
+    return torch.autocast(device.type, dtype=dtype)
+
+
+def environment(device):
+    """Return a dict describing the machine and library versions, stored with every result file"""
+    env = {'python': platform.python_version(), 'torch': torch.__version__, 'platform': platform.platform(),
+           'cpu_count': os.cpu_count(), 'num_threads': torch.get_num_threads(), 'device': str(device)}
+    if device.type == 'cuda':
+        env['gpu'] = torch.cuda.get_device_name(device)
+        env['cuda'] = torch.version.cuda
+        env['cudnn'] = torch.backends.cudnn.version()
+    return env
+
+
+def save_results(path, results, env):
+    """Write the benchmark results and the environment to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump({'environment': env, 'results': results}, f, indent=2)
+    print('saved the results to %s' % path)
+
+
+def load_results(path):
+    """Return the list of results of a JSON file written by <save_results>"""
+    with open(path, 'r') as f:
+        return json.load(f)['results']
+
+
+def compare_results(results, baseline, metric='p50', threshold=0.05):
+    """Compare results against a baseline and print the relative change of every configuration.
+
+    Parameters:
+        results (dict list)  -- the current results
+        baseline (dict list) -- the results to compare to, e.g. loaded with <load_results>
+        metric (str)         -- the latency statistic to compare, e.g. p50 or mean
+        threshold (float)    -- relative slowdown above which a configuration counts as a regression
+
+    Returns the keys of the regressed configurations.
+    """
+    old = {r['key']: r for r in baseline if 'latency_ms' in r}
+    regressions = []
+    print('%-70s %10s %10s %8s' % ('configuration', 'baseline', 'current', 'change'))
+    for r in results:
+        if 'latency_ms' not in r or r['key'] not in old:
+            continue
+        before = old[r['key']]['latency_ms'][metric]
+        after = r['latency_ms'][metric]
+        change = after / before - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(r['key'])
+            flag = '  REGRESSION'
+        print('%-70s %8.2fms %8.2fms %+7.1f%%%s' % (r['key'], before, after, change * 100, flag))
+    missing = set(old) - set(r['key'] for r in results)
+    if missing:
+        print('%d baseline configurations were not run' % len(missing))
+    return regressions
+
+
+def print_result(r):
+    """Print a one-line summary of a result"""
+    if 'error' in r:
+        print('%-70s %s' % (r['key'], r['error']))
+        return
+    lat = r['latency_ms']
+    memory = '%.0fMB' % r['peak_memory_mb'] if r.get('peak_memory_mb') is not None else '-'
+    print('%-70s p50 %8.2fms  p90 %8.2fms  %8.1f img/s  %s' % (r['key'], lat['p50'], lat['p90'], r['images_per_sec'], memory))
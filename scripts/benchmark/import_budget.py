@@ -0,0 +1,74 @@
+"""Check the import time of the modules used by the command line tools against a budget.
+
+Every module is imported in a fresh Python process, after torch (which every tool needs anyway), and the script
+reports the extra import time and the heavy optional libraries (scipy, pandas, seaborn, matplotlib, sklearn) that
+were pulled in. A module fails the check if it takes longer than --budget seconds or loads a heavy library;
+those libraries should be imported in the functions that need them. The script exits with status 1 on a failure.
+
+Example:
+    python -m scripts.benchmark.import_budget
+    python -m scripts.benchmark.import_budget --modules util.visualizer models.networks --budget 0.2 --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+DEFAULT_MODULES = ['models', 'models.networks', 'models.nightdrivecyclegan_model', 'options.test_options',
+                   'options.train_options', 'util.visualizer', 'util.eval_util', 'util.plot_util', 'util.metrics_log',
+                   'scripts.eval_nightdrive.frame_blender', 'scripts.eval_nightdrive.make_video']
+HEAVY_MODULES = ['scipy', 'pandas', 'seaborn', 'matplotlib', 'sklearn']
+
+MEASURE = """
+import sys, time, json
+import torch
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, repeat):
+    """Import <module> in <repeat> fresh processes and return the fastest time and the heavy modules it loaded"""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    best, heavy = None, []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+                             cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if out.returncode != 0:
+            return None, out.stderr.strip().split('\n')[-1]
+        result = json.loads(out.stdout.strip().split('\n')[-1])
+        best = result['seconds'] if best is None else min(best, result['seconds'])
+        heavy = result['heavy']
+    return best, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help='modules to check')
+    parser.add_argument('--budget', type=float, default=0.5, help='maximum import time per module in seconds, on top of torch')
+    parser.add_argument('--repeat', type=int, default=3, help='number of fresh processes per module; the fastest counts')
+    opt = parser.parse_args()
+
+    failures = 0
+    for module in opt.modules:
+        seconds, heavy = measure_import(module, opt.repeat)
+        if seconds is None:
+            print('%-45s  import failed: %s' % (module, heavy))
+            failures += 1
+            continue
+        problems = []
+        if seconds > opt.budget:
+            problems.append('over budget')
+        if heavy:
+            problems.append('loads %s' % ', '.join(heavy))
+        failures += bool(problems)
+        print('%-45s %7.3fs  %s' % (module, seconds, '; '.join(problems) or 'ok'))
+    if failures:
+        print('%d of %d modules failed the import budget of %.2fs' % (failures, len(opt.modules), opt.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
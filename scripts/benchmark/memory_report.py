@@ -0,0 +1,50 @@
+"""Memory report of one training step for a model configuration and input size.
+
+The model is built from the regular training options and one training step is run on a random batch
+(see util/memory_report.py). The script prints the memory of the parameters, gradients and optimizer state of every
+network, of the image pools and of the activations, broken down by module, to size --crop_size and --batch_size
+for a machine without trial-and-error out-of-memory errors.
+
+All unknown arguments are passed on to the training options (options/train_options.py).
+Report options:
+    --height      height of the synthetic images (default --crop_size)
+    --width       width of the synthetic images (default --crop_size)
+    --depth       module depth of the activation breakdown (default 2)
+    --top         number of modules printed (default 20)
+    --output      save the report to this JSON file
+
+Example:
+    python -m scripts.benchmark.memory_report --netG resnet_9blocks --crop_size 360 --batch_size 2 --gpu_ids 0
+"""
+import json
+import argparse
+from models import create_model
+from util.memory_report import memory_report, print_memory_report
+from scripts.benchmark import bench_util
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--height', type=int, default=0)
+    parser.add_argument('--width', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', type=str, default='')
+    report_opt, opt = bench_util.parse_train_options(parser, bench_util.synthetic_defaults('memory_report'))
+    height = report_opt.height or opt.crop_size
+    width = report_opt.width or opt.crop_size
+
+    model = create_model(opt)
+    model.setup(opt)
+    data = bench_util.synthetic_batches(opt, height, width, num_batches=1)[0]
+    report = memory_report(model, data, report_opt.depth)
+    print('%s / %s, batch size %d, %dx%d' % (opt.netG, opt.netD, opt.batch_size, height, width))
+    print_memory_report(report, report_opt.top)
+    if report_opt.output:
+        with open(report_opt.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('saved the report to %s' % report_opt.output)
+
+
+if __name__ == '__main__':
+    main()
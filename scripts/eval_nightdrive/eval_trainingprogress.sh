@@ -2,13 +2,15 @@
 # set -e
 
 # ./scripts/eval_nightdrive/eval_trainingprogress.sh
+#
+# Post-hoc evaluation of saved checkpoints; to evaluate checkpoints while training runs, see nightdrive_watch.py
 
 which_host="Docker"
-if [${which_host}=="Docker"]; then
+if [ "${which_host}" == "Docker" ]; then
     dataroot='/home/SharedFolder/CurrentDatasets/bdd100k_sorted/valid'
     jsonfile='/home/SharedFolder/CurrentDatasets/bdd100k_sorted/annotations/bdd100k_sorted_valid'
     gpu_ids=0
-elif [${which_host}=="till"]; then
+elif [ "${which_host}" == "till" ]; then
     dataroot='/home/till/SharedFolder/CurrentDatasets/bdd100k_sorted/valid/'
     jsonfile='/home/till/SharedFolder/CurrentDatasets/bdd100k_sorted/annotations/bdd100k_sorted_valid'
     gpu_ids=-1
@@ -23,65 +25,35 @@ num_test=10
 results_dir=$"./results/${name}_trainprogress"
 eval_mode="by_iter"
 
-# evaluate by epoch
-if [${eval_mode}=="by_epoch"]; then
+# checkpoints to evaluate: inclusive ranges start:stop:step and/or comma-separated lists
+epochs="100:100:1"
+iters="130000:150000:5000"
 
-    for epoch in {100..100..1}; do
-
-        # execute one model
-        python3 nightdrive_test.py \
-            --model nightdrivecyclegan \
-            --phase test \
-            --no_dropout \
-            --preprocess none \
-            --load_size 1280 \
-            --gpu_ids ${gpu_ids} \
-            --out_style ${out_style} \
-            --dataset_mode ${dataset_mode} \
-            --dataroot ${dataroot} \
-            --jsonfile ${jsonfile} \
-            --results_dir ${results_dir} \
-            --name ${name} \
-            --num_test ${num_test} \
-            --epoch ${epoch} \
-            --out_suffix "_epoch_${epoch}"
-
-        echo "Successfully processed epoch ${epoch}." | lolcat
-
-        # run night classifier on the data
-    done
-fi
-
-
-# evaluate by iter
-if [${eval_mode}=="by_iter"]; then
-
-    for iter in {130000..150000..5000}; do
-
-        # execute one model
-        python3 nightdrive_test.py \
-            --model nightdrivecyclegan \
-            --phase test \
-            --no_dropout \
-            --preprocess none \
-            --load_size 1280 \
-            --gpu_ids ${gpu_ids} \
-            --out_style ${out_style} \
-            --dataset_mode ${dataset_mode} \
-            --dataroot ${dataroot} \
-            --jsonfile ${jsonfile} \
-            --results_dir ${results_dir} \
-            --name ${name} \
-            --num_test ${num_test} \
-            --load_iter ${iter} \
-            --out_suffix "_iter_${iter}"
-
-        echo "Successfully processed epoch ${epoch}." | lolcat
-
-        # run night classifier on the data
-
-    done
+# all checkpoints are evaluated in one process: the test images are loaded once and the generator weights are
+# swapped in place; outputs are suffixed with "_epoch_<epoch>" or "_iter_<iter>"
+if [ "${eval_mode}" == "by_epoch" ]; then
+    eval_by="epoch"
+    checkpoints=${epochs}
+else
+    eval_by="iter"
+    checkpoints=${iters}
 fi
 
-
-
+python3 nightdrive_test.py \
+    --model nightdrivecyclegan \
+    --phase test \
+    --no_dropout \
+    --preprocess none \
+    --load_size 1280 \
+    --gpu_ids ${gpu_ids} \
+    --out_style ${out_style} \
+    --dataset_mode ${dataset_mode} \
+    --dataroot ${dataroot} \
+    --jsonfile ${jsonfile} \
+    --results_dir ${results_dir} \
+    --name ${name} \
+    --num_test ${num_test} \
+    --eval_checkpoints ${checkpoints} \
+    --eval_by ${eval_by}
+
+# run night classifier on the data
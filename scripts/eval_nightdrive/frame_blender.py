@@ -1,7 +1,72 @@
 from PIL import Image
+import numpy as np
+import functools
+import multiprocessing
 import os
-import re
 import argparse
+try:
+    from scripts.eval_nightdrive.frame_catalog import aligned_frames
+except ImportError:  # run as a file, e.g. python3 ./scripts/eval_nightdrive/frame_blender.py
+    from frame_catalog import aligned_frames
+
+
+@functools.lru_cache(maxsize=1024)
+def blend_alpha(width, frac_frame2=0.5, frac_transition=0.01):
+    """
+    Computes the alpha ramp of a blended frame, i.e. the weight of the first frame (0-255) in every column.
+
+    The ramp only depends on the width and the wipe position, so it is cached: a video with a cycle of fpc frames
+    only needs fpc different ramps.
+
+    :param width: Width of the frames in pixels.
+    :param frac_frame2: Width (horizontal) fraction of the output frame taken up by frame2.
+    :param frac_transition: Width (horizontal) fraction of the image that forms a smooth (mixed) transition between the left and right part.
+    :return: Tuple (lo, hi, alpha): columns before lo show frame1, columns from hi on show frame2, and alpha holds the
+    weights of the columns in between as a read-only uint16 array.
+    """
+    # frame1 on the left-hand side, frame2 on the right-hand side
+    alpha = np.full(width, 255, dtype=np.uint16)
+    start_rightpart = width - int(width * frac_frame2)
+    alpha[start_rightpart:] = 0
+
+    # a linear transition zone centered on the border between the two frames
+    if frac_transition > 0:
+        width_transition = int(width * frac_transition)
+        start_transition = int(max(0, (start_rightpart - (width_transition / 2))))
+        ramp = [int(255 - i / width_transition * 255) for i in range(width_transition)]
+        ramp = ramp[:max(0, width - start_transition)]
+        alpha[start_transition:start_transition + len(ramp)] = ramp
+
+    # the ramp decreases from left to right, so the mixed columns form one range
+    lo = int(np.searchsorted(-alpha.astype(np.int32), -254))  # first column with alpha < 255
+    hi = int(np.searchsorted(-alpha.astype(np.int32), 0))     # first column with alpha == 0
+    alpha = alpha[lo:hi]
+    alpha.setflags(write=False)
+    return lo, hi, alpha
+
+
+def blend_arrays(array1, array2, frac_frame2=0.5, frac_transition=0.01):
+    """
+    Blends parts of two frames given as uint8 arrays into one array of the same size, see blend_frame.
+
+    The result is identical to compositing the frames with PIL, including its rounding.
+
+    :param array1: First input frame as H x W or H x W x C uint8 array, will be on the left-hand side of the output frame.
+    :param array2: Second input frame of the same shape, will be on the right-hand side of the output frame.
+    :param frac_frame2: Width (horizontal) fraction of the output frame taken up by frame2.
+    :param frac_transition: Width (horizontal) fraction of the image that forms a smooth (mixed) transition between the left and right part.
+    :return: Blended frame as uint8 array
+    """
+    lo, hi, alpha = blend_alpha(array1.shape[1], frac_frame2, frac_transition)
+    blended = np.empty_like(array2)
+    blended[:, :lo] = array1[:, :lo]
+    blended[:, hi:] = array2[:, hi:]
+    if hi > lo:
+        a = alpha.reshape((1, -1) + (1,) * (array1.ndim - 2))
+        # a * frame1 + (255 - a) * frame2, divided by 255 with rounding as in PIL
+        mixed = array1[:, lo:hi].astype(np.uint16) * a + array2[:, lo:hi].astype(np.uint16) * (255 - a) + 128
+        blended[:, lo:hi] = ((mixed >> 8) + mixed) >> 8
+    return blended
 
 
 def blend_frame(frame1, frame2, frac_frame2=0.5, frac_transition=0.01):
@@ -16,27 +81,8 @@ def blend_frame(frame1, frame2, frac_frame2=0.5, frac_transition=0.01):
 
 
     """
-    # creates a mask indicating the part where frame2 is inserted
-    mask = Image.new('RGBA', frame1.size, color=(0, 0, 0, 255))
-    width_rightpart = int(mask.size[0] * frac_frame2)
-    height_rightpart = mask.size[1]
-    rightpart = Image.new('RGBA', (width_rightpart, height_rightpart), color=(0, 0, 0, 0))
-    start_rightpart = mask.size[0] - width_rightpart
-    mask.paste(rightpart, (start_rightpart, 0))
-
-    # create a transition zone in the mask between the two frames
-    if frac_transition > 0:
-        width_transition = int(mask.size[0] * frac_transition)
-        height_transition = mask.size[1]
-        start_transition = int(max(0, (start_rightpart - (width_transition / 2))))
-        end_transition = int(min(mask.size[0], (start_rightpart + (width_transition / 2))))
-        for i in range(width_transition):
-            transition_part = Image.new('RGBA', (1, height_transition),
-                                        color=(0, 0, 0, int(255 - i / width_transition * 255)))
-            mask.paste(transition_part, (start_transition + i, 0))
-
-    # blend the two frames and return
-    return Image.composite(frame1, frame2, mask)
+    blended = blend_arrays(np.asarray(frame1), np.asarray(frame2), frac_frame2, frac_transition)
+    return Image.fromarray(blended, mode=frame2.mode)
 
 
 def horzcat_frames(*images, pad_fraction=0.01, pad_color=(0, 0, 0)):
@@ -118,6 +164,93 @@ def vertcat_frames(*images, pad_fraction=0.01, pad_color=(0, 0, 0)):
     return im_vertcat
 
 
+def process_frame_pair(job):
+    """
+    Opens a pair of frames once and writes all requested combinations of them (blended, vertcat, horzcat).
+
+    :param job: Tuple (path, fn1, fn2, counter, frac_frame2, out_basename, blend, vertcat, horzcat); the output frames are
+    named after the frame counter, so the order in which pairs are processed does not matter.
+    :return: The frame counter of the pair.
+    """
+    path, fn1, fn2, counter, frac_frame2, out_basename, blend, vertcat, horzcat = job
+    fn_base, fn_ext = os.path.splitext(fn1)
+    # decode both frames once for all outputs
+    frame1 = Image.open(os.path.join(path, fn1))
+    frame1.load()
+    frame2 = Image.open(os.path.join(path, fn2))
+    frame2.load()
+
+    # Blend frames by partially overlapping them
+    if blend:
+        frame_blended = blend_frame(frame1, frame2, frac_frame2=frac_frame2, frac_transition=0.01)
+        frame_blended.save(os.path.join(path, out_basename + 'blended-' + str(counter) + fn_ext))  # Save blended frame
+
+    # Concat frames vertically
+    if vertcat:
+        frame_vertcat = vertcat_frames(frame1, frame2, pad_fraction=0.0, pad_color=None)
+        frame_vertcat.save(os.path.join(path, out_basename + 'vertcat-' + str(counter) + fn_ext))
+
+    # Concat frames horizontally
+    if horzcat:
+        frame_horzcat = horzcat_frames(frame1, frame2, pad_fraction=0.00, pad_color=None)
+        frame_horzcat.save(os.path.join(path, out_basename + 'horzcat-' + str(counter) + fn_ext))
+    return counter
+
+
+def process_frame_pairs(jobs, workers=1, chunksize=16):
+    """
+    Runs process_frame_pair for all jobs, in a pool of worker processes if workers > 1.
+
+    :param jobs: List of jobs for process_frame_pair.
+    :param workers: Number of worker processes; 1 processes the frames in this process.
+    :param chunksize: Number of consecutive jobs a worker takes at a time.
+    """
+    num_frames = len(jobs)
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(process_frame_pair, jobs, chunksize=chunksize)
+    else:
+        pool = None
+        results = map(process_frame_pair, jobs)
+    for i, _ in enumerate(results):
+        # Print progress message
+        if (i+1) % 100 == 0:
+            print("Processed {} of {} frames.".format(i+1, num_frames))
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def blend_directory(path, pattern1="frame-", pattern2="frame-transfer_AtoB-", out_basename="frame-", fpc=300, blend=True,
+                    vertcat=False, horzcat=False, workers=1, chunksize=16):
+    """
+    Blends, horizontally concatenates, and vertically concatenates all frame pairs in a directory.
+
+    :param path: Directory containing the frames.
+    :param pattern1: Pattern identifying the first version of the frames, see frame_catalog.frame_regex.
+    :param pattern2: Pattern identifying the second version of the frames.
+    :param out_basename: Base name of output frames, e.g. "frame-" will give "frame-blended-[0-9]".
+    :param fpc: Frames per cycle of the wipe between the two versions.
+    :param blend: Whether to write blended frames.
+    :param vertcat: Whether to write vertically concatenated frames.
+    :param horzcat: Whether to write horizontally concatenated frames.
+    :param workers: Number of worker processes, see process_frame_pairs.
+    :param chunksize: Number of consecutive frame pairs a worker takes at a time.
+    """
+    # get the frames present in both versions, sorted by their counter
+    frame_counter, list_frames_1, list_frames_2 = aligned_frames(path, pattern1, pattern2)
+    if len(list_frames_2) == 0:
+        raise Exception(f"No frames containing {pattern2} found in {path}.")
+
+    # get the sequence of fractions of the right image shown for each frame
+    fracs_rightpart = [min(i % fpc, -i % fpc) / (fpc / 2) for i in range(len(list_frames_2))]
+
+    # blend original and suffixe'ed frame
+    jobs = [(path, fn1, list_frames_2[i], frame_counter[i], fracs_rightpart[i], out_basename, blend, vertcat, horzcat)
+            for i, fn1 in enumerate(list_frames_1)]
+    process_frame_pairs(jobs, workers, chunksize)
+
+
 if __name__ == "__main__":
     """
     Blend, horizontally concatenate, and vertically concatenate all image pairs in a folder.
@@ -147,69 +280,12 @@ if __name__ == "__main__":
     parser.add_argument('--blend', action='store_true')
     parser.add_argument('--vertcat', action='store_true')
     parser.add_argument('--horzcat', action='store_true')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes; 1 processes the frames serially.')
+    parser.add_argument('--chunksize', type=int, default=16, help='Number of consecutive frame pairs a worker takes at a time.')
     parser.set_defaults(blend=False, vertcat=False, horzcat=False, pattern1="frame-", out_basename="frame-")
 
     # Get arguments
     opt = parser.parse_args()
 
-    # get list of all frames of type 1 to process, i.e. those that contain "opt.suffix"
-    search_pattern_1 = opt.pattern1 + r"\d\d*"
-    list_frames_1 = [fn for fn in os.listdir(opt.path) if re.search(search_pattern_1, fn) is not None]
-    # get list of all frames of type 1 to process, i.e. those that contain "opt.suffix"
-    search_pattern_2 = opt.pattern2 + r"\d\d*"
-    list_frames_2 = [fn for fn in os.listdir(opt.path) if re.search(search_pattern_2, fn) is not None]
-    if len(list_frames_2) == 0:
-        raise Exception(f"No frames containing {opt.pattern2} found in {opt.path}.")
-
-    # get common frames
-    frame_counter_1 = [int(*re.findall(r"\d\d*", f)) for f in list_frames_1]
-    frame_counter_2 = [int(*re.findall(r"\d\d*", f)) for f in list_frames_2]
-    frame_counter_1 = set(frame_counter_1)
-    frame_counter = list(frame_counter_1.intersection(set(frame_counter_2)))
-    list_frames_1 = [fn for fn in list_frames_1 if int(*re.findall(r"\d\d*", fn)) in frame_counter]
-    list_frames_2 = [fn for fn in list_frames_2 if int(*re.findall(r"\d\d*", fn)) in frame_counter]
-
-    # sort the frames by their counter
-    # list 1
-    frame_counter = [int(*re.findall(r"\d\d*", f)) for f in list_frames_1]
-    zipped = zip(frame_counter, list_frames_1)
-    zipped = sorted(zipped, key=lambda k: k[0])
-    frame_counter, list_frames_1 = map(list, zip(*zipped))
-    # list 2
-    frame_counter = [int(*re.findall(r"\d\d*", f)) for f in list_frames_2]
-    zipped = zip(frame_counter, list_frames_2)
-    zipped = sorted(zipped, key=lambda k: k[0])
-    frame_counter, list_frames_2 = map(list, zip(*zipped))
-
-    # get the sequence of fractions of the right image shown for each frame
-    fracs_rightpart = [min(i % opt.fpc, -i % opt.fpc) / (opt.fpc / 2) for i in range(len(list_frames_2))]
-
-    # blend original and suffixe'ed frame
-    num_frames = len(list_frames_1)
-    for i, fn1 in enumerate(list_frames_1):
-
-        # Import a pair of frames
-        fn_base, fn_ext = os.path.splitext(fn1)
-        frame1 = Image.open(os.path.join(opt.path, fn1))
-        fn2 = list_frames_2[i]
-        frame2 = Image.open(os.path.join(opt.path, fn2))
-
-        # Blend frames by partially overlapping them
-        if opt.blend:
-            frame_blended = blend_frame(frame1, frame2, frac_frame2=fracs_rightpart[i], frac_transition=0.01)
-            frame_blended.save(os.path.join(opt.path, opt.out_basename + 'blended-' + str(frame_counter[i]) + fn_ext))  # Save blended frame
-
-        # Concat frames vertically
-        if opt.vertcat:
-            frame_vertcat = vertcat_frames(frame1, frame2, pad_fraction=0.0, pad_color=None)
-            frame_vertcat.save(os.path.join(opt.path, opt.out_basename + 'vertcat-' + str(frame_counter[i]) + fn_ext))
-
-        # Concat frames horizontally
-        if opt.horzcat:
-            frame_horzcat = horzcat_frames(frame1, frame2, pad_fraction=0.00, pad_color=None)
-            frame_horzcat.save(os.path.join(opt.path, opt.out_basename + 'horzcat-' + str(frame_counter[i]) + fn_ext))
-
-        # Print progress message
-        if (i+1) % 100 == 0:
-            print("Processed {} of {} frames.".format(i+1, num_frames))
-
+    blend_directory(opt.path, opt.pattern1, opt.pattern2, opt.out_basename, opt.fpc, opt.blend, opt.vertcat, opt.horzcat,
+                    opt.workers, opt.chunksize)
@@ -0,0 +1,53 @@
+import os
+import re
+
+
+def frame_regex(pattern):
+    """
+    Compiles the regular expression that finds frames of one kind in a file name.
+
+    :param pattern: Pattern identifying the kind of frame, e.g. "frame-" matches "frame-12.png" but not "frame-cam-12.png".
+    It is a regular expression and is searched anywhere in the file name.
+    :return: Compiled regular expression; its only group is the frame counter following the pattern.
+    """
+    return re.compile("(?:" + pattern + r")(\d+)")
+
+
+def scan_frames(path, *patterns):
+    """
+    Indexes the frames in a directory for one or more patterns in a single pass over the directory.
+
+    Every file name is read once from os.scandir and matched against each pattern; the frame counter is the number
+    directly following the pattern.
+
+    :param path: Directory containing the frames.
+    :param patterns: Patterns identifying the kinds of frames, see frame_regex.
+    :return: One dict per pattern, mapping frame counter to file name.
+    """
+    regexes = [frame_regex(p) for p in patterns]
+    catalog = [{} for _ in patterns]
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            for regex, frames in zip(regexes, catalog):
+                match = regex.search(name)
+                if match is not None:
+                    frames[int(match.group(1))] = name
+    return catalog
+
+
+def aligned_frames(path, *patterns):
+    """
+    Finds the frame counters present for all patterns and returns the aligned file names.
+
+    :param path: Directory containing the frames.
+    :param patterns: Patterns identifying the kinds of frames, see frame_regex.
+    :return: Tuple (counters, names_1, names_2, ...): the common frame counters in ascending order and, for each
+    pattern, the file names of these frames in the same order.
+    """
+    catalog = scan_frames(path, *patterns)
+    common = set(catalog[0])
+    for frames in catalog[1:]:
+        common.intersection_update(frames)
+    counters = sorted(common)
+    return (counters,) + tuple([frames[c] for c in counters] for frames in catalog)
@@ -1,309 +1,238 @@
 import os, sys
-import subprocess
 import re
-import shutil
-import pandas as pd
-
-def ffmpeg_vstack(input0, input1, output, frame_rate):
-    cmd = f"ffmpeg -r {str(frame_rate)} -i {input0} -i {input1} -filter_complex vstack=inputs=2 -vcodec libx264 -crf 18 {output}"
-    subprocess.call(cmd, shell=True)
-
-
-def ffmpeg_hstack(input0, input1, output, frame_rate):
-    cmd = f"ffmpeg -r {str(frame_rate)} -i {input0} -i {input1} -filter_complex hstack=inputs=2 -vcodec libx264 -crf 18 {output}"
-    subprocess.call(cmd, shell=True)
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+try:
+    from scripts.eval_nightdrive.video_stages import FrameTranslator, TimeOfDayClassifier, TemporalCache, EncoderSlots, \
+        convert_video, select_layouts, LAYOUTS
+except ImportError:  # run as a file, e.g. python3 ./scripts/eval_nightdrive/make_video.py
+    from video_stages import FrameTranslator, TimeOfDayClassifier, TemporalCache, EncoderSlots, convert_video, \
+        select_layouts, LAYOUTS
+
+# state of a worker: the models are loaded once per worker and used for all of its videos
+_worker = {}
+
+
+def init_worker(test_args, classifier_weights, encoder_slots=None):
+    """
+    Loads the generator and the time-of-day classifier of a worker.
 
-def get_frame_rate(filename):
-    if not os.path.exists(filename):
-        sys.stderr.write("ERROR: filename %r was not found!" % (filename,))
-        return -1
-    out = subprocess.check_output(["ffprobe",filename,"-v","0","-select_streams","v","-print_format","flat","-show_entries","stream=r_frame_rate"])
-    rate = out.split('=')[1].strip()[1:-1].split('/')
-    if len(rate)==1:
-        return float(rate[0])
-    if len(rate)==2:
-        return float(rate[0])/float(rate[1])
-    return -1
+    :param test_args: Arguments for the test options, see video_stages.FrameTranslator.
+    :param classifier_weights: Path to the classifier checkpoint, or None to skip the time-of-day classification.
+    :param encoder_slots: video_stages.EncoderSlots shared by all workers, or None for no limit on the encoders.
+    """
+    _worker['encoder_slots'] = encoder_slots
+    _worker['translator'] = FrameTranslator(test_args)
+    _worker['classifier'] = None
+    if classifier_weights:
+        _worker['classifier'] = TimeOfDayClassifier(classifier_weights, _worker['translator'].device)
 
 
-if __name__ == "__main__":
+def process_video(job):
+    """
+    Converts one video with the models of the worker, see video_stages.convert_video.
 
+    :param job: Dict with the path of the video ("video") and the settings of the run ("out_dir", "layouts", "fpc",
+    "frame_rate_other", "frame_rate_blended", "batch_size", "cam", "second_label", "encoder_threads", "reuse_threshold",
+    "reuse_max").
+    :return: Dict with the path of the video, its "status" ("done" or "failed"), the "outputs" or the "error", the
+    processing time in "seconds" and, with reuse_threshold > 0, the fraction of frames that were not translated ("skip_rate").
     """
-    Example call:
-        cd ~/projects/git-forks/pytorch-CycleGAN-and-pix2pix/
-        python3 ./scripts/eval_nightdrive/make_video.py
+    file_path = job["video"]
+    file = os.path.basename(file_path)  # strip off path
+    file_basename, ext = os.path.splitext(file)
+    start = time.time()
+    cache = TemporalCache(job["reuse_threshold"], job["reuse_max"] or None) if job["reuse_threshold"] > 0 else None
+    try:
+        # decode, transform, label, blend and encode all layouts in one pass over the frames
+        print(f"--- Converting video: {file}")
+        fontscale, fontoutline = (1.8, 3) if job["cam"] else (2.2, 4)
+        outputs = convert_video(file_path, os.path.join(job["out_dir"], file_basename), _worker['translator'],
+                                _worker['classifier'], layouts=job["layouts"], frame_rate=job["frame_rate_other"],
+                                frame_rate_blended=job["frame_rate_blended"], fpc=job["fpc"], batch_size=job["batch_size"],
+                                cam=job["cam"], second_label=job["second_label"], fontscale=fontscale, outline=fontoutline,
+                                encoder_threads=job["encoder_threads"], cache=cache,
+                                encoder_slots=_worker['encoder_slots'])
+        result = {"status": "done", "outputs": outputs}
+        if cache is not None:
+            result["skip_rate"] = round(cache.skip_rate, 4)
+            print(f"--- {file}: reused the outputs of previous frames for {cache.skipped} of {cache.frames} frames")
+    except Exception as e:
+        traceback.print_exc()
+        result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result.update({"video": file_path, "seconds": round(time.time() - start, 1)})
+    return result
+
+
+def load_manifest(path):
     """
-    # Local specs
-    which_host = 'dsr'  # Options: ['till', 'dsr']
-    load_from = 'folder'  # 'bbdjson'  # Options: ['folder', 'bbdjson']
-
-    # Set paths
-    if which_host == 'till':
-        video_dir = "/home/till/SharedFolder/CurrentDatasets/bdd100k/videos/train"
-        out_dir = "/home/till/SharedFolder/CurrentDatasets/bdd100k_video_converted"
-        json_path = "/home/till/SharedFolder/CurrentDatasets/bdd100k/videos/bdd100k_labels_videos.json"
-        project_root = "/home/till/projects/git-forks/pytorch-CycleGAN-and-pix2pix/"
-        project_nightdrive_root = "/home/SharedFolder/git/tillvolkmann/night-drive"
-        gpu_ids = -1
-    elif which_host == 'dsr':
-        video_dir = "/home/SharedFolder/CurrentDatasets/bdd100k/videos/best"  # "/home/SharedFolder/CurrentDatasets/bdd100k/videos/train"
-        out_dir = "/home/SharedFolder/CurrentDatasets/bdd100k_video_converted"
-        project_root = "/home/SharedFolder/git/tillvolkmann/pytorch-CycleGAN-and-pix2pix/"
-        json_path = "/home/SharedFolder/CurrentDatasets/bdd100k/videos/bdd100k_labels_videos.json"
-        project_nightdrive_root = "/home/SharedFolder/git/tillvolkmann/night-drive"
-        gpu_ids = 0
-    else:
-        raise Exception("Host not known.")
-
-    # Specify model checkpoint to use for domain transfer
-    name = 'cgan_aws_v032_backupbeforerestart'  # cgan_aws_v032_backupbeforerestart'  # name of model run / experiment
-    epoch = 14
-    sel_iter = 130000
-    iter_not_epoch = False
-    do_CAM = False
-    do_timeofday_classify = True
-    use_second_label_cam_blended = False
-
-    # set frame rate (slightly accelerated will be good)
-    frame_rate_other = 30
-    frame_rate_blended = 60
+    :param path: Path of the manifest, a JSON file with the status of every video of a run.
+    :return: The manifest, empty if the file does not exist yet.
+    """
+    if not os.path.exists(path):
+        return {"videos": {}}
+    with open(path) as f:
+        return json.load(f)
 
-    # set frames per window slide (approx 5 sec per slide will be good)
-    fpc = frame_rate_blended * 10
 
-    # estension of videos to be read
-    video_extension = "mov"
+def save_manifest(manifest, path):
+    """
+    Writes the manifest atomically, so that an interrupted run leaves a valid manifest to resume from.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
 
-    # suffix of domain-transformed frames
-    suffix_transformed = "transfer_AtoB-"
-    suffix_cam = "cam-"
 
-    # Split all videos in file_basename and store frames in separate sub-directories
-    os.chdir(project_root)
-    if load_from == 'folder':
-        files = [x for x in os.listdir(video_dir) if re.search(video_extension, x) is not None]
-    elif load_from == 'bbdjson':
-        df = pd.read_json(json_path)
+def list_videos(opt):
+    """
+    :return: Paths of the videos to convert: the files in --video_dir with extension --extension or, with --bdd_json,
+    the daytime videos listed in the BDD100K video labels.
+    """
+    if opt.bdd_json is None:
+        files = sorted(x for x in os.listdir(opt.video_dir) if re.search(opt.extension, x) is not None)
+    else:
+        import pandas as pd
+        df = pd.read_json(opt.bdd_json)
         df.reset_index(drop=True, inplace=True)
         df = df.loc[df.attributes.apply(lambda x: x["timeofday"] == "daytime"), :]
-        files = df.name.apply(lambda x: os.path.join(video_dir, x)).tolist()
-    else:
-        raise Exception("Source for loading not understood.")
-
-    # modify out_dir by model run
-    if not iter_not_epoch:
-        out_dir = out_dir+"_"+name+"_e"+str(epoch)
-    elif iter_not_epoch:
-        out_dir = out_dir + "_" + name + "_i" + str(sel_iter)
-
-    # run video maker
-    n_files = len(files)
-    for c, file_path in enumerate(files):
-
-        # Write a status message
-        print("\n\n\n\n\n\n")
-        print("================================================================================")
-        print(f"=== Processing file ({c} of {n_files}): {file_path}")
-        print("================================================================================")
+        files = df.name.tolist()
+    return [os.path.join(opt.video_dir, x) for x in files]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Converts day-time videos to night with a trained generator and writes "
+                                                 "transformed, blended and stacked videos, optionally labelled with the "
+                                                 "time of day predicted by a classifier.")
+    parser.add_argument('--video_dir', type=str, required=True, help='directory containing the videos')
+    parser.add_argument('--out_dir', type=str, required=True, help='output directory; the name and epoch/iteration of the model are appended')
+    parser.add_argument('--extension', type=str, default='mov', help='extension of the videos to convert')
+    parser.add_argument('--bdd_json', type=str, default=None, help='BDD100K video labels; if given, the daytime videos listed there are converted')
+    # model
+    parser.add_argument('--project_root', type=str, default='.', help='root of this repository, where the checkpoints are found')
+    parser.add_argument('--name', type=str, required=True, help='name of the model run / experiment')
+    parser.add_argument('--checkpoints_dir', type=str, default='./checkpoints', help='models are loaded from here')
+    parser.add_argument('--epoch', type=str, default='latest', help='epoch of the checkpoint to use')
+    parser.add_argument('--load_iter', type=int, default=0, help='iteration of the checkpoint to use; if > 0, used instead of --epoch')
+    parser.add_argument('--gpu_ids', type=str, default='0', help='gpu ids: e.g. 0  0,1,2, 0,2. use -1 for CPU')
+    parser.add_argument('--batch_size', type=int, default=8, help='frames translated and classified at a time')
+    parser.add_argument('--reuse_threshold', type=float, default=0,
+                        help='reuse the outputs of the last translated frame for frames differing from it by less than this '
+                             'mean absolute difference of their 32x32 gray thumbnails (gray levels 0-255), e.g. 1.0; 0 translates every frame')
+    parser.add_argument('--reuse_max', type=int, default=30, help='maximum number of consecutive frames reusing outputs; 0 for no limit')
+    # time-of-day classification
+    parser.add_argument('--classifier_weights', type=str, default=None,
+                        help='checkpoint of the ResNet-18 time-of-day classifier, e.g. <night-drive>/classifier_timeofday/models/'
+                             'resnet18_timeofday_daynight_classifier_best.pth; without it, frames are not labelled')
+    parser.add_argument('--cam', action='store_true', help='overlay the class activation maps on the labelled frames')
+    parser.add_argument('--second_label', action='store_true', help='blend with the frames labelled with the second most likely class')
+    # video
+    parser.add_argument('--frame_rate', type=float, default=30, help='frame rate of the transformed and stacked videos')
+    parser.add_argument('--frame_rate_blended', type=float, default=60, help='frame rate of the blended videos')
+    parser.add_argument('--fpc', type=int, default=600, help='frames per cycle of the blended videos')
+    parser.add_argument('--layouts', type=str, nargs='+', default=list(LAYOUTS), choices=list(LAYOUTS),
+                        help='videos to write; the ones with "cam" need --classifier_weights')
+    # scheduling
+    parser.add_argument('--workers', type=int, default=1,
+                        help='videos converted at a time; every worker process loads its own copy of the models')
+    parser.add_argument('--encoder_threads', type=int, default=2,
+                        help='threads of each ffmpeg encoder; a video is encoded by one encoder per layout; 0 lets ffmpeg decide')
+    parser.add_argument('--max_encoders', type=int, default=None,
+                        help='maximum number of ffmpeg encoders running at a time over all workers; a video holds one '
+                             'encoder per layout while it is converted and waits until that many are free, so at most '
+                             'max_encoders / (number of layouts) videos are converted at a time; must be at least the '
+                             'number of layouts written per video [default: workers * number of layouts, i.e. no worker waits]')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='JSON file with the status of every video [default: <out_dir>/manifest.json]; videos that are '
+                             'done are skipped, so an interrupted run can be resumed by running the same command again')
+    parser.add_argument('--retry_failed', action='store_true', help='convert videos that failed in a previous run again')
+    return parser
 
-        # some files operations
-        file = os.path.basename(file_path)  # strip off path
-        file_basename, ext = os.path.splitext(file)
 
-        # make temp dir for frame-by-frame processing, same name as file_basename
-        if not iter_not_epoch:
-            tmp_dir = os.path.join(video_dir, file_basename + "_" + name + "_e" + str(epoch))
-        elif iter_not_epoch:
-            tmp_dir = os.path.join(video_dir, file_basename + "_" + name + "_i" + str(sel_iter))
-        if not os.path.exists(tmp_dir):
-            os.mkdir(tmp_dir)
-
-        # split video
-        print(f"\n\n--- Splitting video: {file} --------------------")
-        cmd = f"ffmpeg -i {os.path.join(video_dir, file)} -start_number 0 {os.path.join(tmp_dir, 'frame-%d.png')}"
-        subprocess.call(cmd, shell=True)
-
-        # run GAN for domain transfer
-        print(f"\n\n--- Transforming video: {file} --------------------")
-        if not iter_not_epoch:
-            subprocess.call(["python3", "./nightdrive_test.py",
-                             "--model", "test",
-                             "--direction", "AtoB",
-                             "--phase", "test",
-                             "--no_dropout",
-                             "--preprocess", "none",
-                             "--load_size", "1280",
-                             "--gpu_ids", str(gpu_ids),
-                             "--dataset_mode", "single",
-                             "--out_style", "frames",
-                             "--dataroot", tmp_dir,
-                             "--results_dir", tmp_dir,
-                             "--name", name,
-                             "--epoch", str(epoch),
-                             "--num_test", "-1",
-                             "--norm", "instance",
-                             "--batch_size", "32",
-                             "--model_suffix", "_A"])
-        elif iter_not_epoch:
-            subprocess.call(["python3", "./nightdrive_test.py",
-                             "--model", "test",
-                             "--direction", "AtoB",
-                             "--phase", "test",
-                             "--no_dropout",
-                             "--preprocess", "none",
-                             "--load_size", "1280",
-                             "--gpu_ids", str(gpu_ids),
-                             "--dataset_mode", "single",
-                             "--out_style", "frames",
-                             "--dataroot", tmp_dir,
-                             "--results_dir", tmp_dir,
-                             "--name", name,
-                             "--load_iter", str(sel_iter),
-                             "--num_test", "-1",
-                             "--norm", "instance",
-                             "--batch_size", "32",
-                             "--model_suffix", "_A"])
-
-
-        # cam projection using fun from nightdrive
-        print(f"\n\n--- Creating CAM overlays: {file} --------------------")
-        if do_CAM or do_timeofday_classify:
-            sys.path.append(project_nightdrive_root)
-            path_weights = os.path.join(project_nightdrive_root,
-                                        'classifier_timeofday/models/resnet18_timeofday_daynight_classifier_best.pth')
-            path_fun = os.path.join(project_nightdrive_root,
-                                    'classifier_timeofday/timeofday_cam.py')
-
-            # cam with tod classify
-            if do_CAM:
-                # transformed frames
-                cmd = f"python3 \
-                    {path_fun} \
-                    --path {tmp_dir} \
-                    --suffix {suffix_transformed} \
-                    --firstlabel \
-                    --fontscale 1.8 \
-                    --fontoutline 3 \
-                    --weights {path_weights}"
-                subprocess.call(cmd, shell=True)
-                # original frames
-                cmd = f"python3 \
-                    {path_fun} \
-                    --path {tmp_dir} \
-                    --suffix '' \
-                    --firstlabel \
-                    --fontscale 1.8 \
-                    --fontoutline 3 \
-                    --weights {path_weights}"
-                subprocess.call(cmd, shell=True)
-
-            # timeofday classification without cam
-            if do_timeofday_classify:
-                # transformed frames
-                cmd = f"python3 \
-                    {path_fun} \
-                    --path {tmp_dir} \
-                    --suffix {suffix_transformed} \
-                    --weights {path_weights} \
-                    --classonly \
-                    --firstlabel \
-                    --fontscale 2.2 \
-                    --fontoutline 4"
-                subprocess.call(cmd, shell=True)
-                # original frames
-                cmd = f"python3 \
-                    {path_fun} \
-                    --path {tmp_dir} \
-                    --suffix '' \
-                    --weights {path_weights}  \
-                    --classonly \
-                    --firstlabel \
-                    --fontscale 2.2 \
-                    --fontoutline 4"
-                subprocess.call(cmd, shell=True)
-
-
-        # blend
-        print(f"\n\n--- Blending video: {file} --------------------")
-        subprocess.call(["python3", "./scripts/eval_nightdrive/frame_blender.py",
-                         "--path", tmp_dir,
-                         "--pattern1", "frame-",
-                         "--pattern2", "frame-transfer_AtoB-",
-                         "--out_basename", "frame-",
-                         "--fpc", str(fpc),
-                         "--blend"])
-
-        # blend with cam
-        if do_CAM or do_timeofday_classify:
-            print(f"\n\n--- Blending video: {file} --------------------")
-            if use_second_label_cam_blended:
-                pattern2 = "frame-transfer_AtoB-cam-second-"
-            else:
-                pattern2 = "frame-transfer_AtoB-cam-"
-            subprocess.call(["python3", "./scripts/eval_nightdrive/frame_blender.py",
-                             "--path", tmp_dir,
-                             "--pattern1", "frame-cam-",
-                             "--pattern2", pattern2,
-                             "--out_basename", "frame-cam-",
-                             "--fpc", str(fpc),
-                             "--blend"])
-
-        # put videos together
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-
-        # get output file names
-        print(f"\n\n--- Writing videos to {out_dir} --------------------")
-        out_file_transfer = os.path.join(out_dir, file_basename + "-transfer_AtoB.mp4")
-        out_file_blended = os.path.join(out_dir, file_basename + "-blended.mp4")
-        out_file_hstack = os.path.join(out_dir, file_basename + "-hstack.mp4")
-        out_file_vstack = os.path.join(out_dir, file_basename + "-vstack.mp4")
-        if do_CAM or do_timeofday_classify:
-            out_file_original_cam = os.path.join(out_dir, file_basename + "-cam.mp4")
-            out_file_transfer_cam = os.path.join(out_dir, file_basename + "-transfer_AtoB-cam.mp4")
-            out_file_hstack_cam = os.path.join(out_dir, file_basename + "-hstack-cam.mp4")
-            out_file_vstack_cam = os.path.join(out_dir, file_basename + "-vstack-cam.mp4")
-            out_file_blended_cam = os.path.join(out_dir, file_basename + "blended-cam.mp4")
-
-        # compose blended video
-        frame_pattern = os.path.join(tmp_dir, 'frame-blended-%d.png')
-        cmd = f"ffmpeg -r {str(frame_rate_blended)} -f image2 -i {frame_pattern} -vcodec libx264 -crf 18 {out_file_blended}"
-        subprocess.call(cmd, shell=True)
-        # blend cam
-        if do_CAM or do_timeofday_classify:
-            frame_pattern = os.path.join(tmp_dir, 'frame-cam-blended-%d.png')
-            cmd = f"ffmpeg -r {str(frame_rate_blended)} -f image2 -i {frame_pattern} -vcodec libx264 -crf 18 {out_file_blended_cam}"
-            subprocess.call(cmd, shell=True)
-
-        # compose fully-transformed video
-        frame_pattern = os.path.join(tmp_dir, 'frame-transfer_AtoB-%d.png')
-        cmd = f"ffmpeg -r {str(frame_rate_other)} -f image2 -i {frame_pattern} -vcodec libx264 -crf 18 {out_file_transfer}"
-        subprocess.call(cmd, shell=True)
-
-        # compose videos with cam overlay
-        if do_CAM or do_timeofday_classify:
-            # compose original video with cam overlay
-            frame_pattern = os.path.join(tmp_dir, 'frame-cam-%d.png')
-            cmd = f"ffmpeg -r {str(frame_rate_other)} -f image2 -i {frame_pattern} -vcodec libx264 -crf 18 {out_file_original_cam}"
-            subprocess.call(cmd, shell=True)
-            # compose fully-transferred video with cam overlay
-            frame_pattern = os.path.join(tmp_dir, 'frame-transfer_AtoB-cam-%d.png')
-            cmd = f"ffmpeg -r {str(frame_rate_other)} -f image2 -i {frame_pattern} -vcodec libx264 -crf 18 {out_file_transfer_cam}"
-            subprocess.call(cmd, shell=True)
-
-        # write vertically-concatenated video (original and fully-transformed)
-        ffmpeg_vstack(file_path, out_file_transfer, out_file_vstack, frame_rate_other)
-        # write horizontally-concatenated video (original and fully-transformed)
-        ffmpeg_hstack(file_path, out_file_transfer, out_file_hstack, frame_rate_other)
-
-        # write concatenated videos with cam overlay
-        if do_CAM or do_timeofday_classify:
-            # write horizontally-concatenated video (original and fully-transformed with cam overlay)
-            ffmpeg_hstack(out_file_original_cam, out_file_transfer_cam, out_file_hstack_cam, frame_rate_other)
-            # write vertically-concatenated video (original and fully-transformed with cam overlay)
-            ffmpeg_vstack(out_file_original_cam, out_file_transfer_cam, out_file_vstack_cam, frame_rate_other)
-
-        # remove temp dir
-        shutil.rmtree(tmp_dir)
+if __name__ == "__main__":
 
+    """
+    Example call:
+        cd ~/projects/git-forks/pytorch-CycleGAN-and-pix2pix/
+        python3 ./scripts/eval_nightdrive/make_video.py \
+            --video_dir /home/SharedFolder/CurrentDatasets/bdd100k/videos/train \
+            --out_dir /home/SharedFolder/CurrentDatasets/bdd100k_video_converted \
+            --name cgan_aws_v032_backupbeforerestart --epoch 14 --gpu_ids 0 \
+            --classifier_weights /home/SharedFolder/git/tillvolkmann/night-drive/classifier_timeofday/models/resnet18_timeofday_daynight_classifier_best.pth \
+            --workers 3 --encoder_threads 2
+    """
+    parser = get_parser()
+    opt = parser.parse_args()
+    n_layouts = len(select_layouts(opt.layouts, opt.classifier_weights is not None, opt.second_label))
+    if opt.max_encoders is None:
+        opt.max_encoders = max(1, opt.workers) * n_layouts
+    if opt.max_encoders < n_layouts:
+        parser.error(f"--max_encoders must be at least the number of layouts written per video ({n_layouts})")
+    opt.video_dir = os.path.abspath(opt.video_dir)
+    if opt.bdd_json is not None:
+        opt.bdd_json = os.path.abspath(opt.bdd_json)
 
+    # modify out_dir by model run
+    run_suffix = "_" + opt.name + ("_i" + str(opt.load_iter) if opt.load_iter > 0 else "_e" + str(opt.epoch))
+    out_dir = os.path.abspath(opt.out_dir) + run_suffix
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.abspath(opt.manifest) if opt.manifest is not None else os.path.join(out_dir, "manifest.json")
+    classifier_weights = os.path.abspath(opt.classifier_weights) if opt.classifier_weights else None
+
+    # the models are loaded relative to the project root
+    os.chdir(opt.project_root)
+    sys.path.insert(0, os.getcwd())
+
+    # skip the videos that are done (or failed, unless retried) according to the manifest
+    manifest = load_manifest(manifest_path)
+    videos = manifest["videos"]
+    skip = ("done",) if opt.retry_failed else ("done", "failed")
+    files = [f for f in list_videos(opt) if videos.get(os.path.basename(f), {}).get("status") not in skip]
+    n_files = len(files)
+    print(f"{n_files} videos to convert, {len(videos)} in the manifest {manifest_path}")
+    if n_files == 0:
+        sys.exit(0)
+
+    test_args = ["--model", "test", "--direction", "AtoB", "--phase", "test", "--no_dropout", "--preprocess", "none",
+                 "--load_size", "1280", "--gpu_ids", opt.gpu_ids, "--dataset_mode", "single", "--dataroot", opt.video_dir,
+                 "--name", opt.name, "--checkpoints_dir", opt.checkpoints_dir, "--epoch", str(opt.epoch),
+                 "--load_iter", str(opt.load_iter), "--norm", "instance", "--model_suffix", "_A"]
+    workers = max(1, min(opt.workers, n_files))
+    # spawn, because CUDA cannot be used in forked processes
+    context = multiprocessing.get_context("spawn")
+    encoder_slots = EncoderSlots(opt.max_encoders, context)
+    jobs = []
+    for file_path in files:
+        jobs.append({"video": file_path, "out_dir": out_dir, "layouts": opt.layouts, "fpc": opt.fpc,
+                     "frame_rate_other": opt.frame_rate, "frame_rate_blended": opt.frame_rate_blended,
+                     "batch_size": opt.batch_size, "cam": opt.cam, "second_label": opt.second_label,
+                     "encoder_threads": opt.encoder_threads, "reuse_threshold": opt.reuse_threshold,
+                     "reuse_max": opt.reuse_max})
+        videos[os.path.basename(file_path)] = {"status": "pending", "video": file_path}
+    save_manifest(manifest, manifest_path)
+
+    # run video maker: one video per worker at a time, the models stay loaded in the workers
+    if workers == 1:
+        init_worker(test_args, classifier_weights, encoder_slots)
+        pool = None
+        results = map(process_video, jobs)
+    else:
+        pool = context.Pool(workers, initializer=init_worker, initargs=(test_args, classifier_weights, encoder_slots))
+        results = pool.imap_unordered(process_video, jobs)
+    failed = 0
+    for c, result in enumerate(results):
+        videos[os.path.basename(result.pop("video"))].update(result)
+        save_manifest(manifest, manifest_path)
+        failed += result["status"] == "failed"
+        print(f"=== {c + 1} of {n_files} videos processed: {result['status']} after {result['seconds']}s"
+              + (f", {100 * result['skip_rate']:.1f}% of frames reused" if "skip_rate" in result else ""))
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if failed:
+        print(f"{failed} videos failed, see {manifest_path}")
+        sys.exit(1)
@@ -0,0 +1,609 @@
+import json
+import queue
+import functools
+import threading
+import contextlib
+import multiprocessing
+import subprocess
+import collections
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image, ImageDraw, ImageFont
+try:
+    from scripts.eval_nightdrive.frame_blender import blend_arrays
+except ImportError:  # run as a file from scripts/eval_nightdrive
+    from frame_blender import blend_arrays
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class FrameTranslator():
+    """
+    Day-to-night translation of video frames with a generator loaded once from a checkpoint.
+
+    The generator is created by the test model with the regular test options (options/test_options.py), exactly as
+    nightdrive_test.py does, so the same checkpoints and arguments work.
+    """
+
+    def __init__(self, test_args):
+        """
+        :param test_args: Arguments for the test options, e.g. ["--name", "cgan_aws", "--model", "test", "--model_suffix", "_A",
+        "--no_dropout", "--epoch", "14", "--gpu_ids", "0"]; --dataroot is not needed.
+        """
+        from options.test_options import TestOptions
+        from models import create_model
+        if '--dataroot' not in test_args:
+            test_args = list(test_args) + ['--dataroot', 'frames']
+        opt = TestOptions().parse(test_args)
+        opt.num_threads = 0
+        opt.batch_size = 1
+        opt.serial_batches = True
+        opt.no_flip = True
+        opt.display_id = -1
+        self.model = create_model(opt)
+        self.model.setup(opt)
+        self.model.eval()
+        self.device = self.model.device
+
+    def __call__(self, real):
+        """
+        :param real: Batch of frames as float tensor in [-1, 1] on self.device.
+        :return: Translated frames as float tensor in [-1, 1].
+        """
+        with torch.no_grad():
+            return self.model.netG(real)
+
+
+class TimeOfDayClassifier():
+    """
+    ResNet-18 time-of-day classifier with class activation maps (CAM), loaded once and run on batches of frames.
+    """
+
+    def __init__(self, weights, device, classes=('daytime', 'night'), input_size=224):
+        """
+        :param weights: Path to the classifier checkpoint: a state dict (optionally under "state_dict" or "model_state_dict",
+        optionally saved from DataParallel) or a pickled model. The number of classes is read from its last layer.
+        :param device: torch.device to run on.
+        :param classes: Class names in the order of the classifier outputs.
+        :param input_size: Frames are resized so that their shorter side has this length before classification.
+        """
+        import torchvision
+        try:  # the checkpoint is local and trusted, it may be a pickled model
+            state = torch.load(weights, map_location='cpu', weights_only=False)
+        except TypeError:  # torch < 1.13 has no weights_only and always unpickles
+            state = torch.load(weights, map_location='cpu')
+        if isinstance(state, torch.nn.Module):
+            state = state.state_dict()
+        for key in ('model_state_dict', 'state_dict'):
+            if key in state:
+                state = state[key]
+        state = {k[len('module.'):] if k.startswith('module.') else k: v for k, v in state.items()}
+        num_classes = state['fc.weight'].shape[0]
+        if len(classes) != num_classes:
+            classes = tuple('class %d' % i for i in range(num_classes))
+        self.net = torchvision.models.resnet18(num_classes=num_classes)
+        self.net.load_state_dict(state)
+        self.net.to(device).eval()
+        self.device = device
+        self.classes = tuple(classes)
+        self.input_size = input_size
+        self.mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+
+    def __call__(self, images, with_cam=False):
+        """
+        Classifies a batch of frames in a single forward pass.
+
+        :param images: Float tensor (B x 3 x H x W) in [-1, 1], as produced by the generator.
+        :param with_cam: Whether to compute the class activation maps.
+        :return: Tuple (probabilities (B x classes), CAMs (B x classes x h x w) or None).
+        """
+        with torch.no_grad():
+            x = (images.to(self.device) + 1) / 2
+            h, w = x.shape[2:]
+            scale = self.input_size / min(h, w)
+            x = F.interpolate(x, size=(round(h * scale), round(w * scale)), mode='bilinear', align_corners=False)
+            x = (x - self.mean) / self.std
+            net = self.net
+            x = net.maxpool(net.relu(net.bn1(net.conv1(x))))
+            features = net.layer4(net.layer3(net.layer2(net.layer1(x))))
+            logits = net.fc(torch.flatten(net.avgpool(features), 1))
+            cams = torch.einsum('kc,bchw->bkhw', net.fc.weight, features) if with_cam else None
+            return logits.softmax(1), cams
+
+
+def jet_colormap():
+    """
+    :return: 256 x 3 uint8 array with the colors of the jet colormap.
+    """
+    x = np.linspace(0, 1, 256)
+    r = np.clip(1.5 - np.abs(4 * x - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * x - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * x - 1), 0, 1)
+    return (np.stack([r, g, b], 1) * 255).round().astype(np.uint8)
+
+
+def overlay_cam(frames, cams, opacity=0.5):
+    """
+    Overlays class activation maps as heat maps on a batch of frames.
+
+    :param frames: uint8 tensor (B x H x W x 3).
+    :param cams: Float tensor (B x h x w), one activation map per frame.
+    :param opacity: Weight of the heat map.
+    :return: uint8 tensor (B x H x W x 3) on the device of cams.
+    """
+    cams = F.interpolate(cams.unsqueeze(1).float(), size=frames.shape[1:3], mode='bilinear', align_corners=False)[:, 0]
+    low = cams.flatten(1).min(1)[0].view(-1, 1, 1)
+    high = cams.flatten(1).max(1)[0].view(-1, 1, 1)
+    index = ((cams - low) / (high - low).clamp(min=1e-8) * 255).round().long()
+    heat = torch.from_numpy(jet_colormap()).to(cams.device)[index].float()
+    blended = frames.to(cams.device).float() * (1 - opacity) + heat * opacity
+    return blended.round().to(torch.uint8)
+
+
+@functools.lru_cache(maxsize=64)
+def label_sprite(text, fontscale=2.2, outline=4):
+    """
+    Renders a label once; the same label on every frame reuses the cached sprite.
+
+    :param text: Label text.
+    :param fontscale: Font scale, about the OpenCV font scale (1 corresponds to a font size of 22 pixels).
+    :param outline: Width of the black outline around the white text, in pixels.
+    :return: Tuple (colors (h x w x 3 uint8), alpha (h x w x 1 float32 in [0, 1])).
+    """
+    size = max(8, int(22 * fontscale))
+    try:
+        font = ImageFont.truetype('DejaVuSans-Bold.ttf', size)
+    except OSError:
+        font = ImageFont.load_default()
+    box = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font, stroke_width=outline)
+    sprite = Image.new('RGBA', (box[2] + outline, box[3] + outline), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((outline, outline), text, font=font, fill=(255, 255, 255, 255),
+                                stroke_width=outline, stroke_fill=(0, 0, 0, 255))
+    sprite = np.asarray(sprite)
+    return sprite[..., :3], sprite[..., 3:].astype(np.float32) / 255
+
+
+def overlay_labels(frames, labels, fontscale=2.2, outline=4, margin=20):
+    """
+    Writes a label into the top-left corner of every frame, processing all frames with the same label at once.
+
+    :param frames: uint8 array (B x H x W x 3); modified in place.
+    :param labels: One label text per frame.
+    :param fontscale: See label_sprite.
+    :param outline: See label_sprite.
+    :param margin: Distance of the label from the top and left border, in pixels.
+    :return: The frames.
+    """
+    labels = np.asarray(labels)
+    for text in np.unique(labels):
+        colors, alpha = label_sprite(str(text), fontscale, outline)
+        h = min(colors.shape[0], frames.shape[1] - margin)
+        w = min(colors.shape[1], frames.shape[2] - margin)
+        if h <= 0 or w <= 0:
+            continue
+        index = np.flatnonzero(labels == text)
+        region = frames[index, margin:margin + h, margin:margin + w].astype(np.float32)
+        region = region * (1 - alpha[:h, :w]) + colors[:h, :w] * alpha[:h, :w]
+        frames[index, margin:margin + h, margin:margin + w] = region.round().astype(np.uint8)
+    return frames
+
+
+def resize_to_base(img, base=4):
+    """
+    Resizes a frame to multiples of base if needed, like the test data loader with --preprocess none.
+
+    :param img: Frame as PIL image.
+    :param base: Height and width of the result are multiples of base, as required by the generator.
+    :return: The frame as PIL image.
+    """
+    ow, oh = img.size
+    w, h = int(round(ow / base) * base), int(round(oh / base) * base)
+    if (w, h) != (ow, oh):
+        img = img.resize((w, h), Image.BICUBIC)
+    return img
+
+
+def frames_to_tensor(frames, device):
+    """
+    Converts uint8 frames to the generator input, as the test data loader does (ToTensor and Normalize with 0.5).
+
+    :param frames: uint8 array (B x H x W x 3), see read_video.
+    :param device: torch.device of the result.
+    :return: Float tensor (B x 3 x H x W) in [-1, 1].
+    """
+    x = torch.from_numpy(frames).to(device).permute(0, 3, 1, 2).float().div(255)
+    return (x - 0.5) / 0.5
+
+
+def tensor_to_frames(images):
+    """
+    Converts generator outputs to uint8 frames, as util.util.tensor2im does.
+
+    :param images: Float tensor (B x 3 x H x W) in [-1, 1].
+    :return: uint8 tensor (B x H x W x 3) on the device of images.
+    """
+    return ((images.permute(0, 2, 3, 1) + 1) / 2.0 * 255.0).to(torch.uint8)
+
+
+class TemporalCache():
+    """
+    Reuses the translation and classification of a frame for the following frames that hardly differ from it, e.g.
+    while the car waits at a traffic light.
+
+    Frames are compared by a signature: the gray values of the frame averaged down to size x size pixels. A frame
+    whose signature differs from the one of the last translated frame by less than threshold gray levels (mean
+    absolute difference) gets the outputs of that frame; the original frame itself is still shown as it is.
+    """
+
+    def __init__(self, threshold=1.0, max_reuse=30, size=32):
+        """
+        :param threshold: Largest mean absolute difference of the signatures (gray levels 0-255) for reusing outputs.
+        :param max_reuse: Maximum number of consecutive frames reusing the outputs of a frame; None for no limit.
+        :param size: Height and width of the signatures.
+        """
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.size = size
+        self.signature = None  # signature of the last translated frame
+        self.outputs = None    # its outputs, see translate_batch
+        self.reused = 0        # number of frames that reused them so far
+        self.frames = 0
+        self.skipped = 0
+
+    @property
+    def skip_rate(self):
+        """Fraction of the frames that reused the outputs of a previous frame"""
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def signatures(self, frames):
+        """
+        :param frames: uint8 array (B x H x W x 3).
+        :return: float32 array (B x size x size) with the averaged gray values of the frames.
+        """
+        x = torch.from_numpy(np.ascontiguousarray(frames[:, ::4, ::4])).float()
+        gray = x @ torch.tensor([0.299, 0.587, 0.114])
+        return F.adaptive_avg_pool2d(gray.unsqueeze(1), self.size)[:, 0].numpy()
+
+    def plan(self, frames):
+        """
+        Decides which frames of a batch need to be translated.
+
+        :param frames: uint8 array (B x H x W x 3), the next frames of the video.
+        :return: Tuple (keys, source): the indices of the frames to translate, and for every frame the position in keys
+        of the frame whose outputs it gets (-1 for the last translated frame of a previous batch).
+        """
+        keys = []
+        source = np.empty(len(frames), dtype=np.int64)
+        for i, signature in enumerate(self.signatures(frames)):
+            if self.signature is not None and (self.max_reuse is None or self.reused < self.max_reuse) \
+                    and np.abs(signature - self.signature).mean() < self.threshold:
+                self.reused += 1
+            else:
+                keys.append(i)
+                self.signature = signature
+                self.reused = 0
+            source[i] = len(keys) - 1
+        self.frames += len(frames)
+        self.skipped += len(frames) - len(keys)
+        return np.array(keys, dtype=np.int64), source
+
+    def expand(self, outputs, source):
+        """
+        :param outputs: Dict of tensors with the outputs of the translated frames of a batch along the first dimension.
+        :param source: See plan.
+        :return: Dict of tensors with the outputs of all frames of the batch.
+        """
+        if self.outputs is not None:
+            outputs = {k: torch.cat([v, outputs[k]]) if k in outputs else v for k, v in self.outputs.items()}
+            source = source + 1
+        self.outputs = {k: v[-1:] for k, v in outputs.items()}
+        index = torch.from_numpy(source)
+        return {k: v[index.to(v.device)] for k, v in outputs.items()}
+
+
+def translate_batch(real_frames, translator, classifier=None, cam=False, second_label=False, fontscale=2.2, outline=4,
+                    cache=None):
+    """
+    Translates a batch of frames and, with a classifier, labels original and translated frames.
+
+    Original and translated frames are classified in one forward pass.
+
+    :param real_frames: uint8 array (B x H x W x 3), see read_video.
+    :param translator: FrameTranslator.
+    :param classifier: TimeOfDayClassifier, or None to only translate.
+    :param cam: Whether to overlay the class activation maps.
+    :param second_label: Whether to also label the frames with the second most likely class.
+    :param fontscale: See label_sprite.
+    :param outline: See label_sprite.
+    :param cache: TemporalCache of the video, or None to translate every frame.
+    :return: OrderedDict of uint8 arrays (B x H x W x 3): "original" and "transfer_AtoB" and, with a classifier,
+    "cam" and "transfer_AtoB-cam" (and "cam-second" and "transfer_AtoB-cam-second" with second_label=True).
+    """
+    n = len(real_frames)
+    keys, source = cache.plan(real_frames) if cache is not None else (np.arange(n), None)
+    outputs = {}
+    if len(keys) > 0:
+        real = frames_to_tensor(real_frames[keys] if len(keys) < n else real_frames, translator.device)
+        fake = translator(real)
+        outputs['fake'] = tensor_to_frames(fake)
+        if classifier is not None:
+            probs, cams = classifier(torch.cat([real, fake]), with_cam=cam)
+            # outputs of original and translated frame side by side
+            outputs['probs'] = torch.stack([probs[:len(keys)], probs[len(keys):]], 1)
+            if cam:
+                outputs['cams'] = torch.stack([cams[:len(keys)], cams[len(keys):]], 1)
+    if cache is not None:
+        outputs = cache.expand(outputs, source)
+    fake_frames = outputs['fake']
+    views = collections.OrderedDict([('original', real_frames), ('transfer_AtoB', fake_frames.cpu().numpy())])
+    if classifier is None:
+        return views
+
+    probs = torch.cat([outputs['probs'][:, 0], outputs['probs'][:, 1]])
+    cams = torch.cat([outputs['cams'][:, 0], outputs['cams'][:, 1]]) if cam else None
+    order = probs.argsort(1, descending=True)
+    both = torch.cat([torch.from_numpy(real_frames).to(fake_frames.device), fake_frames])
+    ranks = [(0, 'cam')] + ([(1, 'cam-second')] if second_label else [])
+    for rank, name in ranks:
+        classes = order[:, rank]
+        frames = both
+        if cam:
+            frames = overlay_cam(frames, cams[torch.arange(len(classes), device=cams.device), classes])
+        frames = overlay_labels(frames.cpu().numpy(), [classifier.classes[k] for k in classes.tolist()], fontscale, outline)
+        views[name] = frames[:n]
+        views['transfer_AtoB-' + name] = frames[n:]
+    return views
+
+
+def probe_video(path):
+    """
+    :param path: Path of a video.
+    :return: Tuple (width, height, frame rate) of its first video stream.
+    """
+    out = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+                          "stream=width,height,r_frame_rate", "-of", "json", path],
+                         stdout=subprocess.PIPE, check=True)
+    stream = json.loads(out.stdout.decode())["streams"][0]
+    num, den = stream["r_frame_rate"].split('/')
+    return int(stream["width"]), int(stream["height"]), float(num) / float(den)
+
+
+def read_video(path, batch_size=8, base=4):
+    """
+    Decodes a video once with ffmpeg and yields its frames in batches, without writing them to disk.
+
+    :param path: Path of the video.
+    :param batch_size: Number of frames per batch.
+    :param base: Frames are resized to multiples of base if needed, see resize_to_base.
+    :return: Generator of uint8 arrays (B x H x W x 3).
+    """
+    width, height, _ = probe_video(path)
+    frame_bytes = width * height * 3
+    decoder = subprocess.Popen(["ffmpeg", "-v", "error", "-i", path, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+                               stdout=subprocess.PIPE)
+    try:
+        batch = []
+        while True:
+            buffer = decoder.stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+            frame = np.frombuffer(buffer, np.uint8).reshape(height, width, 3)
+            if width % base or height % base:
+                frame = np.asarray(resize_to_base(Image.fromarray(frame), base))
+            batch.append(frame)
+            if len(batch) == batch_size:
+                yield np.stack(batch)
+                batch = []
+        if batch:
+            yield np.stack(batch)
+        if decoder.wait() != 0:
+            raise subprocess.CalledProcessError(decoder.returncode, decoder.args)
+    finally:
+        decoder.stdout.close()
+        if decoder.poll() is None:
+            decoder.kill()
+            decoder.wait()
+
+
+class VideoWriter():
+    """
+    Encodes frames to a video by piping them to ffmpeg; a thread feeds the encoder so that several encoders run in
+    parallel with the frame processing.
+    """
+
+    def __init__(self, path, width, height, frame_rate, crf=18, threads=0, queue_size=8):
+        """
+        :param path: Path of the output video.
+        :param width: Width of the frames.
+        :param height: Height of the frames.
+        :param frame_rate: Frame rate of the video.
+        :param crf: Constant rate factor of libx264 (quality, lower is better).
+        :param threads: Number of threads of the encoder; 0 lets ffmpeg decide.
+        :param queue_size: Number of frames that can wait for the encoder.
+        """
+        self.path = path
+        self.encoder = subprocess.Popen(["ffmpeg", "-y", "-v", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                         "-s", "%dx%d" % (width, height), "-r", str(frame_rate), "-i", "-",
+                                         "-vcodec", "libx264", "-crf", str(crf), "-threads", str(threads), path],
+                                        stdin=subprocess.PIPE)
+        self.queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def feed(self):
+        broken = False
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if not broken:
+                try:
+                    self.encoder.stdin.write(frame.tobytes())
+                except (BrokenPipeError, OSError):
+                    broken = True  # keep taking frames, the error is raised by close
+
+    def write(self, frame):
+        """
+        :param frame: uint8 array (H x W x 3).
+        """
+        self.queue.put(frame)
+
+    def close(self):
+        """
+        Waits for the encoder to finish the video; raises subprocess.CalledProcessError if it failed.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.encoder.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        if self.encoder.wait() != 0:
+            raise subprocess.CalledProcessError(self.encoder.returncode, self.encoder.args)
+
+
+class EncoderSlots():
+    """
+    Limits the number of encoders running at a time, over all worker processes that share this object.
+
+    A video needs one encoder per layout for its whole duration, so it reserves all of them at once before it starts;
+    reserving them one by one could deadlock two videos that each hold some of the encoders.
+    """
+
+    def __init__(self, total, context=multiprocessing):
+        """
+        :param total: Maximum number of encoders running at a time.
+        :param context: Multiprocessing context of the workers, e.g. multiprocessing.get_context("spawn").
+        """
+        self.total = total
+        self.semaphore = context.Semaphore(total)
+        self.lock = context.Lock()  # only one video collects encoders at a time
+
+    @contextlib.contextmanager
+    def reserve(self, n):
+        """
+        Waits until n encoders are free and holds them until the end of the with block.
+
+        :param n: Number of encoders, at most total.
+        """
+        if n > self.total:
+            raise ValueError("%d encoders requested, but at most %d may run at a time" % (n, self.total))
+        with self.lock:
+            for _ in range(n):
+                self.semaphore.acquire()
+        try:
+            yield
+        finally:
+            for _ in range(n):
+                self.semaphore.release()
+
+
+# video layouts: name -> (left or top view, right or bottom view, how the views are combined)
+LAYOUTS = collections.OrderedDict([
+    ('transfer_AtoB', ('transfer_AtoB', None, None)),
+    ('blended', ('original', 'transfer_AtoB', 'blend')),
+    ('hstack', ('original', 'transfer_AtoB', 'hstack')),
+    ('vstack', ('original', 'transfer_AtoB', 'vstack')),
+    ('cam', ('cam', None, None)),
+    ('transfer_AtoB-cam', ('transfer_AtoB-cam', None, None)),
+    ('blended-cam', ('cam', 'transfer_AtoB-cam', 'blend')),
+    ('hstack-cam', ('cam', 'transfer_AtoB-cam', 'hstack')),
+    ('vstack-cam', ('cam', 'transfer_AtoB-cam', 'vstack')),
+])
+
+
+def compose_frame(spec, views, i, frac_frame2):
+    """
+    :param spec: Layout as tuple (view1, view2, combine), see LAYOUTS.
+    :param views: Views of a batch, see translate_batch.
+    :param i: Index of the frame in the batch.
+    :param frac_frame2: Fraction of the blended frame taken up by the second view.
+    :return: The frame of the layout as uint8 array.
+    """
+    view1, view2, combine = spec
+    if combine is None:
+        return views[view1][i]
+    if combine == 'blend':
+        return blend_arrays(views[view1][i], views[view2][i], frac_frame2=frac_frame2, frac_transition=0.01)
+    return np.concatenate([views[view1][i], views[view2][i]], axis=1 if combine == 'hstack' else 0)
+
+
+def select_layouts(layouts, labelled=True, second_label=False):
+    """
+    :param layouts: Names of the layouts to write, see LAYOUTS.
+    :param labelled: Whether the frames are labelled by a classifier; the layouts with labels ("cam") are skipped otherwise.
+    :param second_label: Whether the blended video with labels shows the second most likely class on the translated frames.
+    :return: OrderedDict of the layouts that are written, name -> (view1, view2, combine).
+    """
+    specs = collections.OrderedDict((l, LAYOUTS[l]) for l in layouts if labelled or 'cam' not in LAYOUTS[l][0])
+    if second_label and 'blended-cam' in specs:
+        specs['blended-cam'] = ('cam', 'transfer_AtoB-cam-second', 'blend')
+    return specs
+
+
+def convert_video(path, out_prefix, translator, classifier=None, layouts=tuple(LAYOUTS), frame_rate=30,
+                  frame_rate_blended=60, fpc=600, batch_size=8, cam=False, second_label=False, fontscale=2.2, outline=4,
+                  crf=18, encoder_threads=0, cache=None, encoder_slots=None):
+    """
+    Converts a video in a single pass: the frames are decoded once, translated and labelled in batches, and every
+    layout is composed in memory and piped to its own encoder.
+
+    :param path: Path of the video.
+    :param out_prefix: Prefix of the output videos, which are named <out_prefix>-<layout>.mp4.
+    :param translator: FrameTranslator.
+    :param classifier: TimeOfDayClassifier, or None; the layouts with labels ("cam") are skipped without it.
+    :param layouts: Names of the layouts to write, see LAYOUTS.
+    :param frame_rate: Frame rate of the translated and stacked videos.
+    :param frame_rate_blended: Frame rate of the blended videos.
+    :param fpc: Frames per cycle of the wipe in the blended videos.
+    :param batch_size: Number of frames translated and classified at a time.
+    :param cam: Whether to overlay the class activation maps.
+    :param second_label: Whether the blended video with labels shows the second most likely class on the translated frames.
+    :param fontscale: See label_sprite.
+    :param outline: See label_sprite.
+    :param crf: See VideoWriter.
+    :param encoder_threads: See VideoWriter.
+    :param cache: New TemporalCache to reuse the outputs of near-identical consecutive frames, or None.
+    :param encoder_slots: EncoderSlots shared by the workers; the video waits until an encoder per layout is free.
+    None for no limit.
+    :return: Paths of the written videos.
+    """
+    specs = select_layouts(layouts, classifier is not None, second_label)
+    with encoder_slots.reserve(len(specs)) if encoder_slots is not None else contextlib.nullcontext():
+        return _encode_layouts(path, out_prefix, specs, translator, classifier, frame_rate, frame_rate_blended, fpc,
+                               batch_size, cam, second_label, fontscale, outline, crf, encoder_threads, cache)
+
+
+def _encode_layouts(path, out_prefix, specs, translator, classifier, frame_rate, frame_rate_blended, fpc, batch_size,
+                    cam, second_label, fontscale, outline, crf, encoder_threads, cache):
+    """
+    The single pass of convert_video over the frames, see there; specs are the layouts of select_layouts.
+    """
+    writers = collections.OrderedDict()
+    i = 0
+    try:
+        for real_frames in read_video(path, batch_size):
+            views = translate_batch(real_frames, translator, classifier, cam, second_label, fontscale, outline, cache)
+            for j in range(len(real_frames)):
+                frac_frame2 = min(i % fpc, -i % fpc) / (fpc / 2)
+                for layout, spec in specs.items():
+                    frame = compose_frame(spec, views, j, frac_frame2)
+                    if layout not in writers:
+                        rate = frame_rate_blended if spec[2] == 'blend' else frame_rate
+                        writers[layout] = VideoWriter('%s-%s.mp4' % (out_prefix, layout), frame.shape[1], frame.shape[0],
+                                                      rate, crf, encoder_threads)
+                    writers[layout].write(frame)
+                i += 1
+    finally:
+        errors = []
+        for writer in writers.values():
+            try:
+                writer.close()
+            except subprocess.CalledProcessError as e:
+                errors.append(e)
+    if errors:
+        raise errors[0]
+    return [writer.path for writer in writers.values()]
@@ -1,14 +1,16 @@
 import os
 import re
-import pandas as pd
+import ntpath
 from . import util
-from scipy.misc import imresize
 
 
 def parse_loss_log(name):
     """
     Parse the loss_log.txt file generated during training of cycle_gan model.
 
+    The header lines written at every (re)start of training are skipped. For new runs, prefer
+    util.metrics_log.read_metrics_log, which reads the structured metrics_log.jsonl much faster.
+
     Parameters:
         name : str
             name of the experiment / training run, or absolute path to a log_loss txt file
@@ -26,19 +28,50 @@ def parse_loss_log(name):
 
     # parse the file
     data = []
+    names = None
     with open(path, "r") as f:
-        f.readline()  # skip first line
-        line = f.readline()
-        names = re.findall(r"\b[a-zA-Z]\w*", line)  # get variable names
-        while line:
-            digits = map(float, re.findall(r"\d[\d.]*", line))  # get all numerical values
+        for line in f:
+            if not line.startswith("("):  # skip header lines
+                continue
+            if names is None:
+                names = re.findall(r"\b[a-zA-Z]\w*", line)  # get variable names
+            digits = [float(x) for x in re.findall(r"\d[\d.]*", line)]  # get all numerical values
             data.append(digits)
-            line = f.readline()
 
     # return as pandas data frame
+    import pandas as pd  # only needed here; importing pandas takes a while
     return pd.DataFrame(data, columns=names)
 
 
+def parse_checkpoints(spec, by='epoch'):
+    """
+    Parse a list of checkpoints to evaluate, as given by --eval_checkpoints.
+
+    Parameters:
+        spec : str
+            comma-separated checkpoints or inclusive ranges "start:stop:step", e.g. "5,10,latest" or "130000:150000:5000"
+        by : str
+            "epoch" if the checkpoints are epochs, "iter" if they are iterations
+
+    Returns:
+        checkpoints : list of (str, str)
+            for each checkpoint, the prefix of its network files (e.g. "10" or "iter_130000", see
+            BaseModel.load_networks) and the suffix of its output images (e.g. "_epoch_10" or "_iter_130000")
+
+    """
+    names = []
+    for item in spec.split(','):
+        item = item.strip()
+        if ':' in item:
+            start, stop, step = (item.split(':') + ['1'])[:3]
+            names += [str(x) for x in range(int(start), int(stop) + 1, int(step))]
+        elif item:
+            names.append(item)
+    if by == 'iter':
+        return [('iter_' + x, '_iter_' + x) for x in names]
+    return [(x, '_epoch_' + x) for x in names]
+
+
 def save_images_basic(opt, data, results_path, visuals, aspect_ratio=1.0, width=1280):
     """Save images to the disk.
 
@@ -83,9 +116,9 @@ def save_images_basic(opt, data, results_path, visuals, aspect_ratio=1.0, width=
         im = util.tensor2im(im_data)
         h, w, _ = im.shape
         if aspect_ratio > 1.0:
-            im = imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
+            im = util.imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
         elif aspect_ratio < 1.0:
-            im = imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
+            im = util.imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
 
         # construct output image name
         if any([x == opt.out_style for x in ["basic", "basic_single"]]):
@@ -158,9 +191,9 @@ def save_images_progress(webpage, visuals, image_path, aspect_ratio=1.0, width=2
         save_path = os.path.join(image_dir, image_name)
         h, w, _ = im.shape
         if aspect_ratio > 1.0:
-            im = imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
+            im = util.imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
         if aspect_ratio < 1.0:
-            im = imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
+            im = util.imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
         util.save_image(im, save_path)
 
         ims.append(image_name)
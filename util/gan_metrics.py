@@ -0,0 +1,273 @@
+"""This module implements the Fréchet Inception Distance (FID) and the Kernel Inception Distance (KID).
+
+Both compare the features of translated images (fake_B) with those of real images of the target domain, e.g. real
+night images, as computed by a feature extractor: Inception-v3 (2048 pool features) or a ResNet, loaded from a local
+checkpoint (a torchvision state dict), so no weights are downloaded. Scores are only comparable between runs that
+use the same extractor checkpoint and the same reference images.
+
+The statistics of the reference images (mean, covariance and a sample of features for KID) are computed once and
+cached in an .npz file whose name contains a hash of the reference set (paths, sizes and modification times of the
+images, and the preprocessing) and a hash of the extractor checkpoint. Scoring a checkpoint then only needs the
+features of its translated images:
+    >>> metrics = GANMetrics('weights/inception_v3.pth', 'datasets/bdd100k_sorted/valid_night', 'cache/')
+    >>> metrics.add(fake_B)            # for every batch, images in [-1, 1]
+    >>> metrics.compute()              # {'fid': ..., 'kid': ..., 'kid_std': ..., 'num_fakes': ...}
+
+FID needs a few hundred images or more per side to be meaningful; with fewer images than feature dimensions the
+covariance estimates are singular and FID is biased upwards. KID is unbiased and also usable with small sets.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torch.utils.data as data
+from PIL import Image
+from data.image_folder import make_dataset
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+INPUT_SIZES = {'inception_v3': 299, 'resnet18': 224, 'resnet50': 224}
+
+
+def file_hash(path, length=16):
+    """Return the first <length> hex digits of the SHA-256 of the file at <path>"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def resize_images(images, size):
+    """Resize a batch of images (N x 3 x H x W) to <size> x <size> pixels; used for translated and reference images alike"""
+    return F.interpolate(images.float(), size=(size, size), mode='bilinear', align_corners=False, antialias=True)
+
+
+def manifest_hash(paths, extra=None, length=16):
+    """Return a hash of a set of image files that changes if any file is added, removed or modified.
+
+    Parameters:
+        paths (str list) -- the image files
+        extra (dict)     -- further settings that change the statistics, e.g. the input size of the extractor
+        length (int)     -- number of hex digits
+    """
+    manifest = [(os.path.abspath(p), os.path.getsize(p), int(os.path.getmtime(p))) for p in sorted(paths)]
+    text = json.dumps({'files': manifest, 'extra': extra}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:length]
+
+
+class FeatureExtractor():
+    """This class computes the features of images with a classification network loaded from a local checkpoint."""
+
+    def __init__(self, weights, arch='inception_v3', device=torch.device('cpu'), batch_size=32):
+        """Initialize the FeatureExtractor class
+
+        Parameters:
+            weights (str)         -- path to the checkpoint, a torchvision state dict (optionally under 'state_dict'
+                                     or 'model_state_dict', optionally saved from DataParallel) or a pickled model
+            arch (str)            -- the network: inception_v3 | resnet18 | resnet50
+            device (torch.device) -- the device to run on
+            batch_size (int)      -- number of images per forward pass
+        """
+        import torchvision
+        if arch not in INPUT_SIZES:
+            raise NotImplementedError('feature extractor [%s] is not implemented' % arch)
+        try:  # the checkpoint is local and trusted, it may be a pickled model
+            state = torch.load(weights, map_location='cpu', weights_only=False)
+        except TypeError:  # torch < 1.13 has no weights_only and always unpickles
+            state = torch.load(weights, map_location='cpu')
+        if isinstance(state, torch.nn.Module):
+            state = state.state_dict()
+        for key in ('model_state_dict', 'state_dict'):
+            if key in state:
+                state = state[key]
+        state = {k[len('module.'):] if k.startswith('module.') else k: v for k, v in state.items()}
+        num_classes = state['fc.weight'].shape[0]
+        # the torchvision Inception-v3 weights were trained on inputs in [-1, 1]; transform_input remaps the ImageNet
+        # normalized input to that range
+        self.transform_input = arch == 'inception_v3'
+        if arch == 'inception_v3':
+            net = torchvision.models.inception_v3(num_classes=num_classes, aux_logits='AuxLogits.fc.weight' in state,
+                                                  transform_input=self.transform_input, init_weights=False)
+        else:
+            net = getattr(torchvision.models, arch)(num_classes=num_classes)
+        net.load_state_dict(state)
+        net.fc = torch.nn.Identity()  # features of the last pooling layer
+        self.net = net.to(device).eval()
+        self.arch = arch
+        self.hash = file_hash(weights)
+        self.device = device
+        self.batch_size = batch_size
+        self.input_size = INPUT_SIZES[arch]
+        self.mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+
+    def resize(self, images):
+        """Resize a batch of images in [0, 1] (N x 3 x H x W) to the input size of the network"""
+        return resize_images(images.to(self.device), self.input_size)
+
+    def __call__(self, images):
+        """Return the features (N x D float64 array) of a batch of images in [0, 1] at the input size of the network"""
+        features = []
+        with torch.no_grad():
+            for i in range(0, images.shape[0], self.batch_size):
+                x = images[i:i + self.batch_size].to(self.device).float()
+                features.append(self.net((x - self.mean) / self.std).double().cpu())
+        return torch.cat(features).numpy()
+
+
+class ImageFiles(data.Dataset):
+    """Images of a list of files as tensors in [0, 1], resized to a square of <size> pixels"""
+
+    def __init__(self, paths, size):
+        self.paths = paths
+        self.size = size
+
+    def __getitem__(self, index):
+        img = np.asarray(Image.open(self.paths[index]).convert('RGB')).copy()
+        return resize_images(torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0).float() / 255, self.size)[0]
+
+    def __len__(self):
+        return len(self.paths)
+
+
+def reference_statistics(extractor, reference, cache_dir, max_images=float('inf'), kid_features=5000, num_workers=4):
+    """Return the statistics of the reference images, from the cache if possible.
+
+    Parameters:
+        extractor (FeatureExtractor) -- the feature extractor
+        reference (str)              -- directory of the reference images (searched recursively)
+        cache_dir (str)              -- directory of the cached statistics
+        max_images (int)             -- use at most this many reference images
+        kid_features (int)           -- number of reference features kept for KID
+        num_workers (int)            -- number of processes decoding the images
+
+    Returns a dict with 'mu' (D), 'sigma' (D x D), 'features' (N x D, at most <kid_features> rows) and 'num_images'.
+    """
+    paths = sorted(make_dataset(reference, max_images))
+    if not paths:
+        raise ValueError('no reference images found in %s' % reference)
+    key = manifest_hash(paths, {'input_size': extractor.input_size, 'transform_input': extractor.transform_input,
+                                'kid_features': kid_features})
+    cache_path = os.path.join(cache_dir, 'ref_%s_%s_%s.npz' % (key, extractor.arch, extractor.hash))
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return {k: cached[k] for k in cached.files}
+
+    # decode the images in workers, at the input size of the extractor
+    loader = data.DataLoader(ImageFiles(paths, extractor.input_size), batch_size=extractor.batch_size,
+                             num_workers=num_workers)
+    features = np.concatenate([extractor(images) for images in loader])
+    sample = np.random.RandomState(0).permutation(len(features))[:kid_features]
+    stats = {'mu': features.mean(0), 'sigma': np.cov(features, rowvar=False), 'features': features[np.sort(sample)],
+             'num_images': np.array(len(features))}
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_path = cache_path[:-len('.npz')] + '.tmp.npz'
+    np.savez(tmp_path, **stats)
+    os.replace(tmp_path, cache_path)  # complete files only, another process may read the cache
+    return stats
+
+
+def frechet_distance(mu1, sigma1, mu2, sigma2):
+    """Return the Fréchet distance between two Gaussians given by their means and covariances.
+
+    The trace of sqrtm(sigma1 sigma2) is computed from the eigenvalues of sqrt(sigma1) sigma2 sqrt(sigma1), which is
+    symmetric positive semi-definite, so no matrix square root of a non-symmetric matrix is needed.
+    """
+    w, v = np.linalg.eigh(sigma1)
+    sqrt_sigma1 = (v * np.sqrt(np.clip(w, 0, None))) @ v.T
+    eigenvalues = np.linalg.eigvalsh(sqrt_sigma1 @ sigma2 @ sqrt_sigma1)
+    tr_covmean = np.sqrt(np.clip(eigenvalues, 0, None)).sum()
+    diff = mu1 - mu2
+    return float(diff @ diff + np.trace(sigma1) + np.trace(sigma2) - 2 * tr_covmean)
+
+
+def kernel_distance(features1, features2, num_subsets=100, subset_size=1000, seed=0):
+    """Return the mean and standard deviation of the Kernel Inception Distance over random subsets.
+
+    KID is the unbiased estimate of the squared maximum mean discrepancy with the kernel k(x, y) = (x.y / D + 1) ** 3.
+    """
+    n = min(len(features1), len(features2), subset_size)
+    d = features1.shape[1]
+    rng = np.random.RandomState(seed)
+    scores = []
+    for _ in range(num_subsets):
+        x = features1[rng.choice(len(features1), n, replace=False)]
+        y = features2[rng.choice(len(features2), n, replace=False)]
+        k_xx = (x @ x.T / d + 1) ** 3
+        k_yy = (y @ y.T / d + 1) ** 3
+        k_xy = (x @ y.T / d + 1) ** 3
+        mmd = (k_xx.sum() - np.trace(k_xx) + k_yy.sum() - np.trace(k_yy)) / (n * (n - 1)) - 2 * k_xy.mean()
+        scores.append(mmd)
+    return float(np.mean(scores)), float(np.std(scores))
+
+
+class GANMetrics():
+    """This class scores translated images against the cached statistics of reference images with FID and KID.
+
+    Call <add> with every batch of translated images and <compute> after the last one; <compute> starts a new set.
+    """
+
+    def __init__(self, weights, reference, cache_dir, arch='inception_v3', device=torch.device('cpu'), batch_size=32,
+                 max_reference=float('inf'), num_workers=4):
+        """Initialize the GANMetrics class; computes or loads the reference statistics
+
+        Parameters:
+            weights (str)         -- checkpoint of the feature extractor, see FeatureExtractor
+            reference (str)       -- directory of the real images of the target domain
+            cache_dir (str)       -- directory of the cached reference statistics
+            arch (str)            -- the feature extractor: inception_v3 | resnet18 | resnet50
+            device (torch.device) -- the device to run the feature extractor on
+            batch_size (int)      -- number of images per forward pass of the feature extractor
+            max_reference (int)   -- use at most this many reference images
+            num_workers (int)     -- number of processes decoding the reference images
+        """
+        self.extractor = FeatureExtractor(weights, arch, device, batch_size)
+        self.reference = reference_statistics(self.extractor, reference, cache_dir, max_reference, num_workers=num_workers)
+        self.pending = []  # translated images waiting for a full batch, at the input size of the extractor
+        self.features = []
+
+    def add(self, images):
+        """Add a batch of translated images in [-1, 1] (N x 3 x H x W); features are computed in full batches"""
+        self.pending.append(self.extractor.resize((images.detach() + 1) / 2))
+        if sum(x.shape[0] for x in self.pending) >= self.extractor.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Compute the features of the pending images"""
+        if self.pending:
+            self.features.append(self.extractor(torch.cat(self.pending)))
+            self.pending = []
+
+    def compute(self):
+        """Return a dict with 'fid', 'kid', 'kid_std' and 'num_fakes' of the images added since the last call"""
+        self.flush()
+        features = np.concatenate(self.features) if self.features else np.zeros((0, 1))
+        self.features = []
+        if len(features) < 2:
+            raise ValueError('FID and KID need at least 2 translated images, got %d' % len(features))
+        ref = self.reference
+        fid = frechet_distance(features.mean(0), np.cov(features, rowvar=False), ref['mu'], ref['sigma'])
+        kid, kid_std = kernel_distance(features, ref['features'])
+        return {'fid': fid, 'kid': kid, 'kid_std': kid_std, 'num_fakes': len(features)}
+
+
+def create_gan_metrics(opt, device):
+    """Create a GANMetrics object given the --fid_* options, or return None if --fid_reference is not set
+
+    Parameters:
+        opt (Option class)    -- test options, see options/test_options.py
+        device (torch.device) -- the device to run the feature extractor on, e.g. model.device
+    """
+    if not opt.fid_reference:
+        return None
+    if not opt.fid_weights:
+        raise ValueError('--fid_reference needs the checkpoint of a feature extractor, see --fid_weights')
+    cache_dir = opt.fid_cache_dir or os.path.join(opt.checkpoints_dir, 'fid_cache')
+    metrics = GANMetrics(opt.fid_weights, opt.fid_reference, cache_dir, opt.fid_arch, device, opt.fid_batch_size,
+                         opt.fid_max_reference)
+    print('FID/KID reference: %d images in %s' % (metrics.reference['num_images'], opt.fid_reference))
+    return metrics
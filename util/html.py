@@ -1,5 +1,5 @@
 import dominate
-from dominate.tags import meta, h3, table, tr, td, p, a, img, br
+from dominate.tags import meta, h3, table, tr, td, p, a, img, br, span
 import os
 
 
@@ -45,6 +45,18 @@ class HTML:
         with self.doc:
             h3(text)
 
+    def add_links(self, links):
+        """Insert a row of text links to the HTML file, e.g. to navigate between pages
+
+        Parameters:
+            links (list of (str, str)) -- (text, href) pairs
+        """
+        with self.doc:
+            with p():
+                for text, href in links:
+                    a(text, href=href)
+                    span(' ')
+
     def add_images(self, ims, txts, links, width=400):
         """add images to the HTML file
 
@@ -65,12 +77,18 @@ class HTML:
                             br()
                             p(txt)
 
-    def save(self):
-        """save the current content to the HMTL file"""
-        html_file = '%s/index.html' % self.web_dir
-        f = open(html_file, 'wt')
-        f.write(self.doc.render())
-        f.close()
+    def save(self, filenames=('index.html',)):
+        """save the current content to the HMTL file
+
+        Parameters:
+            filenames (str list) -- names of the files in <web_dir> that the content is written to
+        """
+        content = self.doc.render()
+        for filename in filenames:
+            html_file = os.path.join(self.web_dir, filename)
+            f = open(html_file, 'wt')
+            f.write(content)
+            f.close()
 
 
 if __name__ == '__main__':  # we show an example usage here.
@@ -1,4 +1,3 @@
-import random
 import torch
 
 
@@ -7,6 +6,9 @@ class ImagePool():
 
     This buffer enables us to update discriminators using a history of generated images
     rather than the ones produced by the latest generators.
+
+    The buffer is a single tensor on the device of the generated images, allocated on the first query.
+    Each query draws its random decisions for the whole batch at once, so there is no Python loop over images.
     """
 
     def __init__(self, pool_size):
@@ -18,7 +20,7 @@ class ImagePool():
         self.pool_size = pool_size
         if self.pool_size > 0:  # create an empty pool
             self.num_imgs = 0
-            self.images = []
+            self.images = None  # (pool_size + 1) x C x H x W tensor; the extra last slot absorbs writes that are discarded
 
     def query(self, images):
         """Return an image from the pool.
@@ -34,21 +36,39 @@ class ImagePool():
         """
         if self.pool_size == 0:  # if the buffer size is 0, do nothing
             return images
-        return_images = []
-        for image in images:
-            image = torch.unsqueeze(image.data, 0)
-            if self.num_imgs < self.pool_size:   # if the buffer is not full; keep inserting current images to the buffer
-                self.num_imgs = self.num_imgs + 1
-                self.images.append(image)
-                return_images.append(image)
-            else:
-                p = random.uniform(0, 1)
-                if p > 0.5:  # by 50% chance, the buffer will return a previously stored image, and insert the current image into the buffer
-                    random_id = random.randint(0, self.pool_size - 1)  # randint is inclusive
-                    tmp = self.images[random_id].clone()
-                    self.images[random_id] = image
-                    return_images.append(tmp)
-                else:       # by another 50% chance, the buffer will return the current image
-                    return_images.append(image)
-        return_images = torch.cat(return_images, 0)   # collect all the images and return
+        images = images.detach()
+        if self.images is None:
+            self.images = images.new_empty((self.pool_size + 1,) + images.shape[1:])
+        num_insert = min(self.pool_size - self.num_imgs, images.size(0))
+        if num_insert > 0:  # if the buffer is not full; keep inserting current images to the buffer
+            self.images[self.num_imgs:self.num_imgs + num_insert] = images[:num_insert]
+            self.num_imgs += num_insert
+            if num_insert == images.size(0):
+                return images
+            return torch.cat([images[:num_insert], self.swap(images[num_insert:])], 0)
+        return self.swap(images)
+
+    def swap(self, images):
+        """Swap images with random buffer entries with a 50% chance each; the buffer needs to be full.
+
+        The result is the same as swapping the images one after another: if several images pick the same
+        buffer entry, an image gets the one inserted by the previous image, and the last one stays in the buffer.
+        """
+        n = images.size(0)
+        device = images.device
+        swap = torch.rand(n, device=device) > 0.5  # by 50% chance, return a previously stored image and insert the current one
+        slots = torch.randint(0, self.pool_size, (n,), device=device)
+        order = torch.arange(n, device=device)
+        # same[i, j]: images i and j both swap with the same buffer entry
+        same = (slots.unsqueeze(1) == slots.unsqueeze(0)) & swap.unsqueeze(0) & swap.unsqueeze(1)
+        # the last earlier image swapping with the same entry (or -1), and whether a later one overwrites this image
+        previous = torch.where(same & (order.unsqueeze(0) < order.unsqueeze(1)), order.unsqueeze(0), order.new_full((1,), -1)).max(1)[0]
+        overwritten = (same & (order.unsqueeze(0) > order.unsqueeze(1))).any(1)
+
+        shape = (n,) + (1,) * (images.dim() - 1)
+        stored = torch.where((previous >= 0).view(shape), images[previous.clamp(min=0)], self.images[slots])
+        return_images = torch.where(swap.view(shape), stored, images)
+        # write the swapped images into the buffer; writes that are discarded go to the extra last slot
+        targets = torch.where(swap & ~overwritten, slots, slots.new_full((1,), self.pool_size))
+        self.images.index_copy_(0, targets, images)
         return return_images
@@ -0,0 +1,188 @@
+"""This module implements a memory analysis of a model from a dry run of one training step.
+
+The report covers the parameters, gradients and optimizer state of every network, the image pools, and the activations:
+the tensors autograd keeps for the backward pass, which usually dominate the memory at high resolutions.
+Activations are counted with torch.autograd.graph.saved_tensors_hooks and attributed to the innermost module whose
+forward pass saved them, so they can be broken down by module. Their peak is the largest amount alive at any time
+during the step. Tensors that share memory are counted once, and parameters saved for backward are not counted again.
+"""
+import collections
+import torch
+from util.image_pool import ImagePool
+
+MB = 2 ** 20
+
+
+def tensor_bytes(tensors):
+    """Return the memory in bytes of the tensors in <tensors> (None entries are skipped)"""
+    return sum(t.nelement() * t.element_size() for t in tensors if t is not None)
+
+
+class _Saved():
+    """A tensor saved for backward; tells the tracker when autograd frees it"""
+    __slots__ = ('tensor', 'tracker', 'key')
+
+    def __init__(self, tensor, tracker, key):
+        self.tensor = tensor
+        self.tracker = tracker
+        self.key = key
+
+    def __del__(self):
+        self.tracker.release(self.key)
+
+
+class ActivationTracker():
+    """This class measures the memory of the tensors saved for backward while it is active, per module.
+
+    Use it as a context manager around a forward and backward pass:
+        >>> with ActivationTracker({'G_A': netG_A, 'D_A': netD_A}) as tracker:
+        ...     loss = criterion(netD_A(netG_A(x)), True)
+        ...     loss.backward()
+        >>> tracker.peak_bytes, tracker.by_module
+    """
+
+    def __init__(self, nets):
+        """Initialize the ActivationTracker class
+
+        Parameters:
+            nets (dict) -- the networks to observe, by name; the names prefix the module names in the report
+        """
+        self.nets = nets
+        self.live = {}           # storage address -> [bytes, number of saved tensors using it]
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self.by_module = collections.OrderedDict()  # module name -> bytes saved for backward by its forward passes
+        self.stack = []          # names of the modules whose forward pass is running
+        self.handles = []
+        self.param_keys = set(p.untyped_storage().data_ptr() for net in nets.values() for p in net.parameters())
+        self.hooks = torch.autograd.graph.saved_tensors_hooks(self.pack, self.unpack)
+
+    def __enter__(self):
+        for net_name, net in self.nets.items():
+            for name, module in net.named_modules():
+                full_name = net_name + ('.' + name if name else '')
+                self.handles.append(module.register_forward_pre_hook(self.make_enter_hook(full_name)))
+                self.handles.append(module.register_forward_hook(self.exit_hook))
+        self.hooks.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.hooks.__exit__(*exc)
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+        return False
+
+    def make_enter_hook(self, name):
+        """Return a forward pre-hook that marks the module <name> as running"""
+        def enter_hook(module, inputs):
+            self.stack.append(name)
+        return enter_hook
+
+    def exit_hook(self, module, inputs, output):
+        """Forward hook that marks the innermost module as finished"""
+        self.stack.pop()
+
+    def pack(self, tensor):
+        """Count a tensor that autograd saves for backward"""
+        storage = tensor.untyped_storage()
+        key = storage.data_ptr()
+        if key == 0 or key in self.param_keys:  # empty tensors and parameters take no extra memory
+            return tensor
+        entry = self.live.get(key)
+        if entry is None:
+            nbytes = storage.nbytes()
+            self.live[key] = [nbytes, 1]
+            self.live_bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+            module = self.stack[-1] if self.stack else '(outside of modules)'
+            self.by_module[module] = self.by_module.get(module, 0) + nbytes
+        else:
+            entry[1] += 1
+        return _Saved(tensor, self, key)
+
+    def unpack(self, saved):
+        """Return a saved tensor for the backward pass"""
+        return saved.tensor if isinstance(saved, _Saved) else saved
+
+    def release(self, key):
+        """Uncount a saved tensor that autograd freed"""
+        entry = self.live[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            self.live_bytes -= entry[0]
+            del self.live[key]
+
+    def module_breakdown(self, depth=2):
+        """Return the saved bytes summed over modules up to <depth> levels below the networks, largest first"""
+        totals = collections.OrderedDict()
+        for name, nbytes in self.by_module.items():
+            key = '.'.join(name.split('.')[:depth + 1])
+            totals[key] = totals.get(key, 0) + nbytes
+        return collections.OrderedDict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def memory_report(model, data, depth=2):
+    """Run one training step of <model> on <data> and return its memory use.
+
+    Parameters:
+        model (BaseModel) -- the model, after <setup>; its weights are updated by the step
+        data (dict)       -- one batch in the format of the data loader
+        depth (int)       -- the module depth of the activation breakdown (0: whole networks)
+
+    Returns an OrderedDict with sizes in MB: per network ('networks'), 'image_pools', the activation peak and
+    breakdown, the 'estimated_peak' (parameters, gradients, optimizer state, pools and activation peak) and,
+    on a GPU, the 'measured_peak' of the allocator.
+    """
+    nets = collections.OrderedDict((name, getattr(model, 'net' + name)) for name in model.model_names)
+    if model.device.type == 'cuda':
+        torch.cuda.synchronize(model.device)
+        torch.cuda.reset_peak_memory_stats(model.device)
+    with ActivationTracker(nets) as tracker:
+        model.set_input(data)
+        model.optimize_parameters()
+
+    owner = {}  # parameter -> network name, to split the optimizer state by network
+    for name, net in nets.items():
+        for p in net.parameters():
+            owner[p] = name
+    optimizer_bytes = collections.defaultdict(int)
+    for optimizer in model.optimizers:
+        for p, state in optimizer.state.items():
+            optimizer_bytes[owner.get(p, '(other)')] += tensor_bytes(v for v in state.values() if torch.is_tensor(v))
+
+    report = collections.OrderedDict()
+    report['networks'] = collections.OrderedDict()
+    static = 0
+    for name, net in nets.items():
+        params = list(net.parameters())
+        sizes = collections.OrderedDict([('parameters', tensor_bytes(params) / MB),
+                                         ('gradients', tensor_bytes(p.grad for p in params) / MB),
+                                         ('optimizer_state', optimizer_bytes[name] / MB)])
+        report['networks'][name] = sizes
+        static += sum(sizes.values())
+    pools = [v for v in vars(model).values() if isinstance(v, ImagePool) and v.pool_size > 0 and v.images is not None]
+    report['image_pools'] = tensor_bytes(pool.images for pool in pools) / MB
+    static += report['image_pools']
+    report['activations_peak'] = tracker.peak_bytes / MB
+    report['activations_by_module'] = collections.OrderedDict((k, v / MB) for k, v in tracker.module_breakdown(depth).items())
+    report['estimated_peak'] = static + report['activations_peak']
+    if model.device.type == 'cuda':
+        report['measured_peak'] = torch.cuda.max_memory_allocated(model.device) / MB
+    return report
+
+
+def print_memory_report(report, top=20):
+    """Print a report of <memory_report>, with the <top> modules holding the most activations"""
+    print('---------- Memory report (MB) -------------')
+    print('%-10s %12s %12s %16s' % ('network', 'parameters', 'gradients', 'optimizer state'))
+    for name, sizes in report['networks'].items():
+        print('%-10s %12.1f %12.1f %16.1f' % (name, sizes['parameters'], sizes['gradients'], sizes['optimizer_state']))
+    print('image pools: %.1f' % report['image_pools'])
+    print('activations saved for backward, peak: %.1f' % report['activations_peak'])
+    for name, size in list(report['activations_by_module'].items())[:top]:
+        print('    %-50s %10.1f' % (name, size))
+    print('estimated peak: %.1f' % report['estimated_peak'])
+    if 'measured_peak' in report:
+        print('measured peak (allocator): %.1f' % report['measured_peak'])
+    print('-------------------------------------------')
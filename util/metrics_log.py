@@ -0,0 +1,88 @@
+"""This module implements a structured, append-only log for training metrics and a fast reader for it.
+
+Each row is one JSON object on its own line (JSON lines), e.g.
+    {"kind": "losses", "time": 1561234567.8, "epoch": 3, "iters": 400, "total_iters": 12400, "t_comp": 0.31, "t_data": 0.002, "D_A": 0.24, ...}
+Rows are never rewritten, so restarting a training run simply appends to the same file.
+"""
+import os
+import json
+import time
+
+
+class MetricsLog():
+    """This class appends rows of metrics to a JSON lines file."""
+
+    def __init__(self, path):
+        """Initialize the MetricsLog class
+
+        Parameters:
+            path (str) -- the path of the log file; it is created if it does not exist
+        """
+        self.path = path
+
+    def write(self, kind, **values):
+        """Append a row to the log.
+
+        Parameters:
+            kind (str) -- the type of the row, e.g. 'start' or 'losses'; rows of the same kind have the same columns
+            values     -- the metrics of this row; a 'time' column with the current wall time is added
+        """
+        row = {'kind': kind, 'time': time.time()}
+        row.update(values)
+        with open(self.path, 'a') as log_file:
+            log_file.write(json.dumps(row) + '\n')
+
+
+def read_metrics_log(name, columns=None, kind='losses'):
+    """Read a metrics log file into a pandas data frame.
+
+    Parameters:
+        name (str)           -- name of the experiment / training run, or path to a metrics_log.jsonl file
+        columns (str list)   -- only load these columns (all columns if None)
+        kind (str)           -- only load rows of this kind (all rows if None)
+
+    Returns a pandas data frame with one row per log entry.
+
+    If pyarrow is installed, the file is parsed by its multi-threaded JSON reader, and with <columns>,
+    other fields are skipped during parsing; otherwise the rows are parsed one by one with the json module.
+    """
+    import pandas as pd
+
+    if os.path.isfile(name):
+        path = name
+    else:
+        path = os.path.join("checkpoints/", name, "metrics_log.jsonl")
+
+    wanted = None
+    if columns is not None:
+        wanted = list(columns)
+        if kind is not None and 'kind' not in wanted:
+            wanted.append('kind')
+
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pa_json
+    except ImportError:
+        pa_json = None
+
+    if pa_json is not None:
+        parse_options = None
+        if wanted is not None:  # a schema for the requested columns makes the reader skip all other fields
+            schema = pa.schema([(c, pa.string() if c == 'kind' else pa.float64()) for c in wanted])
+            parse_options = pa_json.ParseOptions(explicit_schema=schema, unexpected_field_behavior='ignore')
+        df = pa_json.read_json(path, parse_options=parse_options).to_pandas()
+    else:
+        rows = []
+        with open(path, 'r') as f:
+            for line in f:
+                row = json.loads(line)
+                if wanted is not None:
+                    row = {c: row.get(c) for c in wanted}
+                rows.append(row)
+        df = pd.DataFrame(rows, columns=wanted)
+
+    if kind is not None and 'kind' in df.columns:
+        df = df[df['kind'] == kind].reset_index(drop=True)
+        if columns is not None and 'kind' not in columns:
+            df = df.drop(columns='kind')
+    return df
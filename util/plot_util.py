@@ -1,8 +1,5 @@
-import pandas as pd
-import seaborn as sns
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.utils.multiclass import unique_labels
+# pandas, seaborn, matplotlib and sklearn are imported in the functions that use them, as they are slow to import
 
 
 def print_confusion_matrix(confusion_matrix, class_names, figsize=(10, 7), fontsize=14):
@@ -26,6 +23,10 @@ def print_confusion_matrix(confusion_matrix, class_names, figsize=(10, 7), fonts
     matplotlib.figure.Figure
         The resulting confusion matrix figure
     """
+    import pandas as pd
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
     # process fontsizes
     fontsize_labels = fontsize
     fontsize_ticklabels = int(fontsize * 0.8)
@@ -49,11 +50,15 @@ def print_confusion_matrix(confusion_matrix, class_names, figsize=(10, 7), fonts
 def plot_confusion_matrix(y_true, y_pred, classes,
                           normalize=False,
                           title=None,
-                          cmap=plt.cm.Blues):
+                          cmap='Blues'):
     """
     This function prints and plots the confusion matrix.
     Normalization can be applied by setting `normalize=True`.
     """
+    import matplotlib.pyplot as plt
+    from sklearn import metrics
+    from sklearn.utils.multiclass import unique_labels
+
     if not title:
         if normalize:
             title = 'Normalized confusion matrix'
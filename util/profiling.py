@@ -0,0 +1,88 @@
+"""This module implements capturing a window of training or test iterations with torch.profiler."""
+import os
+import torch
+
+
+def parse_profile_iters(spec):
+    """Parse a --profile_iters string.
+
+    Parameters:
+        spec (str) -- 'start:end' (counted from 0, end excluded), or '' for no profiling
+
+    Returns (start, end) or None.
+    """
+    if not spec:
+        return None
+    try:
+        start, end = [int(x) for x in spec.split(':')]
+    except ValueError:
+        raise ValueError('--profile_iters must be of the form start:end, got %s' % spec)
+    if start < 0 or end <= start:
+        raise ValueError('--profile_iters needs 0 <= start < end, got %s' % spec)
+    return start, end
+
+
+class ProfileWindow():
+    """This class runs torch.profiler over the iterations [start, end) and saves the results.
+
+    Call <step> at the start of every iteration and <close> after the loop. While profiling, the stages of
+    <timer> (see util.stage_timer.StageTimer) show up as labelled ranges in the trace, e.g. 'set_input' or 'G_backward'.
+    At the end of the window, a Chrome trace (open in chrome://tracing or Perfetto) and a table of the operators
+    with the highest self time are written to <save_dir>.
+    """
+
+    def __init__(self, spec, save_dir, timer=None, row_limit=30):
+        """Initialize the ProfileWindow class
+
+        Parameters:
+            spec (str)            -- the iterations to profile as 'start:end'; '' disables profiling
+            save_dir (str)        -- the directory for the trace and the operator table
+            timer (StageTimer)    -- the timer whose stages are recorded as ranges, or None
+            row_limit (int)       -- the number of operators in the table
+        """
+        self.window = parse_profile_iters(spec)
+        self.save_dir = save_dir
+        self.timer = timer
+        self.row_limit = row_limit
+        self.profiler = None
+
+    def step(self, i):
+        """Start or stop profiling before iteration <i>"""
+        if self.window is None:
+            return
+        if i == self.window[0] and self.profiler is None:
+            self.start()
+        elif i == self.window[1] and self.profiler is not None:
+            self.stop()
+
+    def start(self):
+        """Start the profiler"""
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+        self.profiler.start()
+        if self.timer is not None:
+            self.timer.record = True
+        print('profiling iterations %d to %d' % self.window)
+
+    def stop(self):
+        """Stop the profiler and save the Chrome trace and the operator table"""
+        if self.timer is not None:
+            self.timer.record = False
+        self.profiler.stop()
+        name = 'profile_iters_%d_%d' % self.window
+        trace_path = os.path.join(self.save_dir, name + '_trace.json')
+        self.profiler.export_chrome_trace(trace_path)
+        sort_by = 'self_cuda_time_total' if torch.cuda.is_available() else 'self_cpu_time_total'
+        table = self.profiler.key_averages().table(sort_by=sort_by, row_limit=self.row_limit)
+        table_path = os.path.join(self.save_dir, name + '_ops.txt')
+        with open(table_path, 'w') as table_file:
+            table_file.write(table + '\n')
+        print('saved the profile to %s and %s' % (trace_path, table_path))
+        self.profiler = None
+
+    def close(self):
+        """Stop profiling if the loop ended inside the window"""
+        if self.profiler is not None:
+            self.stop()
@@ -0,0 +1,122 @@
+"""This module implements a timer for the stages of a training iteration (data loading, forward, backward, ...)."""
+import time
+import collections
+import numpy as np
+import torch
+
+
+class StageTimer():
+    """This class measures the time spent in named stages and summarizes the last <window> measurements of each stage.
+
+    Stages are timed with a context manager:
+        >>> with timer.stage('G_forward'):
+        ...     model.forward()
+    If the timer is disabled, <stage> returns a shared no-op context, so the instrumentation can stay in the hot path.
+    While <record> is set (see util.profiling.ProfileWindow), every stage is also a labelled range in the profiler trace.
+    Blocks that enclose timed stages are only marked in the trace with <range>, so that no time is counted twice.
+    With <sync>, the device is synchronized at the start and end of every stage, so that asynchronous GPU work
+    is attributed to the stage that launched it (at the cost of some throughput).
+    """
+
+    def __init__(self, enabled=False, sync=False, window=100):
+        """Initialize the StageTimer class
+
+        Parameters:
+            enabled (bool) -- if the timer measures anything
+            sync (bool)    -- if synchronize the CUDA device around every stage (ignored without CUDA)
+            window (int)   -- the number of recent measurements per stage used for the summary
+        """
+        self.enabled = enabled
+        self.sync = enabled and sync and torch.cuda.is_available()
+        self.record = False  # if the stages are marked with torch.profiler.record_function
+        self.window = window
+        self.times = collections.OrderedDict()             # stage name -> deque of durations in seconds
+        self.steps = collections.deque(maxlen=window + 1)  # (time stamp, number of images) at the end of every iteration
+
+    def stage(self, name):
+        """Return a context manager that times the stage <name>"""
+        if not (self.enabled or self.record):
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def range(self, name):
+        """Return a context manager that marks the range <name> in the profiler trace while <record> is set, without timing it"""
+        if not self.record:
+            return _NULL_STAGE
+        return torch.profiler.record_function(name)
+
+    def synchronize(self):
+        """Wait for the device to finish its queued work, if synchronized timing is enabled"""
+        if self.sync:
+            torch.cuda.synchronize()
+
+    def add(self, name, seconds):
+        """Record a duration of <seconds> for the stage <name> that was measured elsewhere"""
+        if not self.enabled:
+            return
+        if name not in self.times:
+            self.times[name] = collections.deque(maxlen=self.window)
+        self.times[name].append(seconds)
+
+    def step(self, num_images):
+        """Mark the end of an iteration that processed <num_images> images; used for the throughput"""
+        if self.enabled:
+            self.steps.append((time.perf_counter(), num_images))
+
+    def summary(self):
+        """Return the rolling statistics of all stages.
+
+        Returns an OrderedDict with, for every stage, its median, 90th and 99th percentile and mean duration (in seconds)
+        over the last <window> measurements, e.g. 'G_forward_p50'; and 'images_per_sec' over the last <window> iterations.
+        """
+        stats = collections.OrderedDict()
+        for name, durations in self.times.items():
+            if not durations:
+                continue
+            values = np.array(durations)
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            stats[name + '_p50'] = float(p50)
+            stats[name + '_p90'] = float(p90)
+            stats[name + '_p99'] = float(p99)
+            stats[name + '_mean'] = float(values.mean())
+        if len(self.steps) > 1:
+            elapsed = self.steps[-1][0] - self.steps[0][0]
+            images = sum(n for _, n in list(self.steps)[1:])
+            stats['images_per_sec'] = images / elapsed if elapsed > 0 else 0.0
+        return stats
+
+
+class _Stage():
+    """Context manager that adds the duration of its block to a StageTimer"""
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.range = None
+
+    def __enter__(self):
+        if self.timer.record:
+            self.range = torch.profiler.record_function(self.name)
+            self.range.__enter__()
+        self.timer.synchronize()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.synchronize()
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        if self.range is not None:
+            self.range.__exit__(*exc)
+        return False
+
+
+class _NullStage():
+    """Context manager that does nothing; used when timing is disabled"""
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
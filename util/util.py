@@ -57,6 +57,20 @@ def save_image(image_numpy, image_path):
     image_pil.save(image_path)
 
 
+def imresize(image_numpy, size, interp='bicubic'):
+    """Resize a numpy image with scipy.misc.imresize
+
+    Parameters:
+        image_numpy (numpy array) -- input numpy array
+        size (tuple)              -- the output size as (height, width)
+        interp (str)              -- the interpolation method
+
+    scipy is imported on the first call, so that importing this module stays fast.
+    """
+    from scipy.misc import imresize as scipy_imresize
+    return scipy_imresize(image_numpy, size, interp=interp)
+
+
 def print_numpy(x, val=True, shp=False):
     """Print the mean, min, max, median, std, and size of a numpy array
 
@@ -3,9 +3,11 @@ import os
 import sys
 import ntpath
 import time
+import threading
+import collections
 from . import util, html
+from .metrics_log import MetricsLog
 from subprocess import Popen, PIPE
-from scipy.misc import imresize
 
 if sys.version_info[0] == 2:
     VisdomExceptionBase = Exception
@@ -38,9 +40,9 @@ def save_images(webpage, visuals, image_path, aspect_ratio=1.0, width=256):
         save_path = os.path.join(image_dir, image_name)
         h, w, _ = im.shape
         if aspect_ratio > 1.0:
-            im = imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
+            im = util.imresize(im, (h, int(w * aspect_ratio)), interp='bicubic')
         if aspect_ratio < 1.0:
-            im = imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
+            im = util.imresize(im, (int(h / aspect_ratio), w), interp='bicubic')
         util.save_image(im, save_path)
 
         ims.append(image_name)
@@ -49,6 +51,108 @@ def save_images(webpage, visuals, image_path, aspect_ratio=1.0, width=256):
     webpage.add_images(ims, txts, links, width=width)
 
 
+class VisdomPublisher(threading.Thread):
+    """This class sends updates to visdom from a background thread, so that training does not wait for the server.
+
+    Image frames are kept in a bounded queue; if it is full, the oldest (stale) frame is dropped.
+    Loss points are not dropped: all points collected since the last update are appended to the plot in a single call,
+    so the cost of an update does not depend on the length of the run. If the plot has to be recreated, e.g. after the
+    server was restarted, it is rebuilt from the last <max_history> points.
+    """
+
+    def __init__(self, vis, on_error, max_frames=2, max_history=10000):
+        """Initialize the VisdomPublisher class and start its thread
+
+        Parameters:
+            vis (visdom.Visdom) -- the connection to the visdom server
+            on_error (function) -- called if the server cannot be reached
+            max_frames (int)    -- the maximum number of image frames waiting to be sent
+            max_history (int)   -- the maximum number of loss points kept to recreate the plot
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.vis = vis
+        self.on_error = on_error
+        self.frames = collections.deque(maxlen=max_frames)
+        self.points = []            # loss points that have not been sent yet
+        self.history = collections.deque(maxlen=max_history)  # the last loss points; sent at once if the plot window needs to be (re)created
+        self.plot_args = None       # (opts, win) of the loss plot
+        self.plot_created = False
+        self.closed = False
+        self.cond = threading.Condition()
+        self.start()
+
+    def publish_frame(self, send):
+        """Queue a frame of images
+
+        Parameters:
+            send (function) -- a function without arguments that sends the frame to visdom
+        """
+        with self.cond:
+            self.frames.append(send)
+            self.cond.notify()
+
+    def publish_point(self, x, y, opts, win):
+        """Queue a point of the loss plot
+
+        Parameters:
+            x (float)       -- the x value (progress in epochs)
+            y (float list)  -- the y values, one per legend entry
+            opts (dict)     -- visdom plot options
+            win (int)       -- the visdom window of the plot
+        """
+        with self.cond:
+            self.points.append((x, y))
+            self.plot_args = (opts, win)
+            self.cond.notify()
+
+    def close(self, timeout=10.0):
+        """Send the remaining updates and stop the thread"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.join(timeout)
+
+    def run(self):
+        """Send queued updates until <close> is called"""
+        while True:
+            with self.cond:
+                while not self.frames and not self.points and not self.closed:
+                    self.cond.wait()
+                if not self.frames and not self.points:  # closed and nothing left to send
+                    return
+                send = self.frames.popleft() if self.frames else None
+                points, self.points = self.points, []
+                opts, win = self.plot_args if self.plot_args is not None else (None, None)
+            try:
+                if points:
+                    try:
+                        self.send_points(points, opts, win)
+                    except Exception:
+                        self.plot_created = False  # the plot is sent in full with the next points
+                        raise
+                if send is not None:
+                    send()
+            except VisdomExceptionBase:
+                self.on_error()
+            except Exception as e:  # keep the thread alive, later updates may succeed
+                print('Could not send the visdom update: %s: %s' % (type(e).__name__, e))
+
+    def send_points(self, points, opts, win):
+        """Append points to the loss plot; create the plot from all points so far if it does not exist yet"""
+        self.history.extend(points)
+        if not self.plot_created:
+            points = list(self.history)
+        X = np.array([x for x, _ in points])
+        Y = np.array([y for _, y in points])
+        self.vis.line(
+            X=np.stack([X] * Y.shape[1], 1),
+            Y=Y,
+            opts=opts,
+            win=win,
+            update='append' if self.plot_created else None)
+        self.plot_created = True
+
+
 class Visualizer():
     """This class includes several functions that can display/save images and print/save logging information.
 
@@ -63,7 +167,7 @@ class Visualizer():
         Step 1: Cache the training/test options
         Step 2: connect to a visdom server
         Step 3: create an HTML object for saveing HTML filters
-        Step 4: create a logging file to store training losses
+        Step 4: create a logging file to store training losses, and a structured metrics log (see metrics_log.py)
         """
         self.opt = opt  # cache the option
         self.display_id = opt.display_id
@@ -78,6 +182,7 @@ class Visualizer():
             self.vis = visdom.Visdom(server=opt.display_server, port=opt.display_port, env=opt.display_env) # , use_incoming_socket=False)   # @tv added use_incoming_socket=False
             if not self.vis.check_connection():
                 self.create_visdom_connections()
+            self.publisher = VisdomPublisher(self.vis, self.create_visdom_connections, opt.display_queue_size)  # sends updates in the background
 
         if self.use_html:  # create an HTML object at <checkpoints_dir>/web/; images will be saved under <checkpoints_dir>/web/images/
             self.web_dir = os.path.join(opt.checkpoints_dir, opt.name, 'web')
@@ -89,11 +194,18 @@ class Visualizer():
         with open(self.log_name, "a") as log_file:
             now = time.strftime("%c")
             log_file.write('================ Training Loss (%s) ================\n' % now)
+        self.metrics_log = MetricsLog(os.path.join(opt.checkpoints_dir, opt.name, 'metrics_log.jsonl'))
+        self.metrics_log.write('start', name=opt.name)
 
     def reset(self):
         """Reset the self.saved status"""
         self.saved = False
 
+    def close(self):
+        """Send the pending visdom updates and stop the background publisher"""
+        if self.display_id > 0:
+            self.publisher.close()
+
     def create_visdom_connections(self):
         """If the program could not connect to Visdom server, this function will start a new server at port < self.port > """
         cmd = sys.executable + ' -m visdom.server -p %d &>/dev/null &' % self.port
@@ -139,25 +251,22 @@ class Visualizer():
                     idx += 1
                 if label_html_row != '':
                     label_html += '<tr>%s</tr>' % label_html_row
-                try:
+                label_html = '<table>%s</table>' % label_html
+
+                def send():
                     self.vis.images(images, nrow=ncols, win=self.display_id + 1,
                                     padding=2, opts=dict(title=title + ' images'))
-                    label_html = '<table>%s</table>' % label_html
                     self.vis.text(table_css + label_html, win=self.display_id + 2,
                                   opts=dict(title=title + ' labels'))
-                except VisdomExceptionBase:
-                    self.create_visdom_connections()
+                self.publisher.publish_frame(send)
 
             else:     # show each image in a separate visdom panel;
-                idx = 1
-                try:
-                    for label, image in visuals.items():
-                        image_numpy = util.tensor2im(image)
-                        self.vis.image(image_numpy.transpose([2, 0, 1]), opts=dict(title=label),
-                                       win=self.display_id + idx)
-                        idx += 1
-                except VisdomExceptionBase:
-                    self.create_visdom_connections()
+                images = [(label, util.tensor2im(image).transpose([2, 0, 1])) for label, image in visuals.items()]
+
+                def send():
+                    for idx, (label, image_numpy) in enumerate(images, 1):
+                        self.vis.image(image_numpy, opts=dict(title=label), win=self.display_id + idx)
+                self.publisher.publish_frame(send)
 
         if self.use_html and (save_result or not self.saved):  # save images to an HTML file if they haven't been saved.
             self.saved = True
@@ -168,19 +277,33 @@ class Visualizer():
                 util.save_image(image_numpy, img_path)
 
             # update website
-            webpage = html.HTML(self.web_dir, 'Experiment name = %s' % self.name, refresh=1)
-            for n in range(epoch, 0, -1):
-                webpage.add_header('epoch [%d]' % n)
-                ims, txts, links = [], [], []
+            self.update_html_page(epoch, list(visuals.keys()))
 
-                for label, image_numpy in visuals.items():
-                    image_numpy = util.tensor2im(image)
-                    img_path = 'epoch%.3d_%s.png' % (n, label)
-                    ims.append(img_path)
-                    txts.append(label)
-                    links.append(img_path)
-                webpage.add_images(ims, txts, links, width=self.win_size)
-            webpage.save()
+    def update_html_page(self, epoch, labels):
+        """Rewrite the page of the HTML report that contains the given epoch.
+
+        Parameters:
+            epoch (int) - - the current epoch
+            labels (str list) - - the names of the images saved for every epoch
+
+        The report is split into pages of <html_epochs_per_page> epochs (index_000.html, index_001.html, ...);
+        index.html is a copy of the latest page. Earlier pages are never touched again, so the cost of an update
+        does not grow with the number of epochs.
+        """
+        per_page = self.opt.html_epochs_per_page
+        page = (epoch - 1) // per_page
+        webpage = html.HTML(self.web_dir, 'Experiment name = %s' % self.name, refresh=1)
+        links = [('latest', 'index.html')]
+        if page > 0:
+            links.append(('epochs %d-%d' % ((page - 1) * per_page + 1, page * per_page), 'index_%03d.html' % (page - 1)))
+        webpage.add_links(links)
+        for n in range(epoch, page * per_page, -1):
+            ims = ['epoch%.3d_%s.png' % (n, label) for label in labels]
+            if not os.path.exists(os.path.join(self.img_dir, ims[0])):  # e.g. epochs skipped by --epoch_count
+                continue
+            webpage.add_header('epoch [%d]' % n)
+            webpage.add_images(ims, labels, ims, width=self.win_size)
+        webpage.save(['index_%03d.html' % page, 'index.html'])
 
     def plot_current_losses(self, epoch, counter_ratio, losses):
         """display the current losses on visdom display: dictionary of error labels and values
@@ -190,25 +313,20 @@ class Visualizer():
             counter_ratio (float) -- progress (percentage) in the current epoch, between 0 to 1
             losses (OrderedDict)  -- training losses stored in the format of (name, float) pairs
         """
-        if not hasattr(self, 'plot_data'):
-            self.plot_data = {'X': [], 'Y': [], 'legend': list(losses.keys())}
-        self.plot_data['X'].append(epoch + counter_ratio)
-        self.plot_data['Y'].append([losses[k] for k in self.plot_data['legend']])
-        try:
-            self.vis.line(
-                X=np.stack([np.array(self.plot_data['X'])] * len(self.plot_data['legend']), 1),
-                Y=np.array(self.plot_data['Y']),
-                opts={
-                    'title': self.name + ' loss over time',
-                    'legend': self.plot_data['legend'],
-                    'xlabel': 'epoch',
-                    'ylabel': 'loss'},
-                win=self.display_id)
-        except VisdomExceptionBase:
-            self.create_visdom_connections()
+        if not hasattr(self, 'plot_legend'):
+            self.plot_legend = list(losses.keys())
+        self.publisher.publish_point(
+            epoch + counter_ratio,
+            [losses[k] for k in self.plot_legend],
+            opts={
+                'title': self.name + ' loss over time',
+                'legend': self.plot_legend,
+                'xlabel': 'epoch',
+                'ylabel': 'loss'},
+            win=self.display_id)
 
     # losses: same format as |losses| of plot_current_losses
-    def print_current_losses(self, epoch, iters, losses, t_comp, t_data):
+    def print_current_losses(self, epoch, iters, losses, t_comp, t_data, total_iters=None):
         """print current losses on console; also save the losses to the disk
 
         Parameters:
@@ -217,6 +335,7 @@ class Visualizer():
             losses (OrderedDict) -- training losses stored in the format of (name, float) pairs
             t_comp (float) -- computational time per data point (normalized by batch_size)
             t_data (float) -- data loading time per data point (normalized by batch_size)
+            total_iters (int) -- total number of training iterations so far; only stored in the metrics log
         """
         message = '(epoch: %d, iters: %d, time: %.3f, data: %.3f) ' % (epoch, iters, t_comp, t_data)
         for k, v in losses.items():
@@ -225,3 +344,21 @@ class Visualizer():
         print(message)  # print the message
         with open(self.log_name, "a") as log_file:
             log_file.write('%s\n' % message)  # save the message
+        self.metrics_log.write('losses', epoch=epoch, iters=iters, total_iters=total_iters, t_comp=t_comp, t_data=t_data, **losses)
+
+    def print_current_timing(self, epoch, iters, timing, total_iters=None):
+        """print the rolling stage timings on console; also save them to the metrics log
+
+        Parameters:
+            epoch (int) -- current epoch
+            iters (int) -- current training iteration during this epoch (reset to 0 at the end of every epoch)
+            timing (OrderedDict) -- stage statistics in seconds and 'images_per_sec', see util.stage_timer.StageTimer.summary
+            total_iters (int) -- total number of training iterations so far
+        """
+        message = 'timing (epoch: %d, iters: %d, images/sec: %.1f) ' % (epoch, iters, timing.get('images_per_sec', 0.0))
+        for k, v in timing.items():
+            if k.endswith('_p50'):  # median [p90] in milliseconds
+                stage = k[:-len('_p50')]
+                message += '%s: %.1f [%.1f] ' % (stage, v * 1000, timing[stage + '_p90'] * 1000)
+        print(message)  # not written to loss_log.txt, which only holds loss lines
+        self.metrics_log.write('timing', epoch=epoch, iters=iters, total_iters=total_iters, **timing)